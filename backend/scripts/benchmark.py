@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Benchmark Script
+Measure the Python search and ingest hot paths on synthetic corpora
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from embed_text import embed_text
+from fetch_rss import clean_text, extract_tags_by_theme
+from semantic_search import SemanticSearchEngine
+from test_comprehensive import create_comprehensive_results, test_queries
+from test_netflix import create_netflix_results
+from test_semantic import create_sample_results
+
+BENCHMARKS = [
+    "clean_text",
+    "extract_tags_by_theme",
+    "embed_text",
+    "expand_query_semantically",
+    "rank_results_semantically",
+]
+
+EXTRA_QUERIES = [
+    "I want to build a software that handles frontend and backend solutions. Give all the last blog posts that will help me be up-to-date concerning theses subjects, the new technologies, architectures solutions and AI tools",
+    "machine learning tutorials",
+    "how does spotify recommend music",
+    "latest react and typescript best practices",
+    "kubernetes deployment for healthcare platforms",
+]
+
+HTML_WRAPPERS = [
+    "<p>{}</p>",
+    "<div><h2>{}</h2><p>{}</p></div>",
+    '<article><p>{}</p><a href="https://example.com">read more</a><p>{}</p></article>',
+]
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[benchmark][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def fixture_posts():
+    """Collect the sample posts shared by the demo test scripts"""
+    return (
+        create_comprehensive_results()
+        + create_netflix_results()
+        + create_sample_results()
+    )
+
+
+def fixture_queries():
+    """Collect the demo queries plus a few representative extras"""
+    return [q["query"] for q in test_queries()] + EXTRA_QUERIES
+
+
+def fixture_themes(posts):
+    """Build a themes table shaped like `get_themes_and_tags()` from fixture tags"""
+    tags = sorted({tag for post in posts for tag in post.get("tags", [])})
+    themes = []
+    for i in range(0, len(tags), 8):
+        themes.append((f"theme_{i // 8}", ",".join(tags[i : i + 8])))
+    return themes
+
+
+def make_corpus(size: int, seed: int = 42):
+    """
+    Generate `size` synthetic posts by recombining fixture titles, descriptions
+    and tags. Each post also gets an HTML `content` body for `clean_text`.
+    """
+    rng = random.Random(seed)
+    base = fixture_posts()
+    corpus = []
+    for i in range(size):
+        a, b = rng.choice(base), rng.choice(base)
+        description = f"{a['description']} {b['description']}"
+        wrapper = rng.choice(HTML_WRAPPERS)
+        paragraphs = [
+            rng.choice(base)["description"] for _ in range(wrapper.count("{}"))
+        ]
+        tags = sorted(set(a.get("tags", []) + b.get("tags", [])[:1]))
+        corpus.append(
+            {
+                "id": str(i),
+                "title": a["title"] if i % 2 else b["title"],
+                "description": description,
+                "content": wrapper.format(*paragraphs) * rng.randint(1, 6),
+                "tags": tags,
+                "themes": [],
+                "score": round(rng.uniform(1.0, 10.0), 3),
+            }
+        )
+    return corpus
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile over an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    k = max(
+        0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1)
+    )
+    return sorted_values[k]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def measure(fn, inputs, items_per_call: int = 1):
+    """Call `fn` once per input and summarize the per-call latencies"""
+    latencies = []
+    t_start = time.perf_counter()
+    for item in inputs:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    total = time.perf_counter() - t_start
+    latencies.sort()
+    calls = len(latencies)
+    return {
+        "calls": calls,
+        "items": calls * items_per_call,
+        "total_s": round(total, 4),
+        "throughput_per_s": round(calls * items_per_call / total, 2) if total else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 4),
+        "p95_ms": round(percentile(latencies, 95), 4),
+        "p99_ms": round(percentile(latencies, 99), 4),
+        "peak_rss_mb": round(peak_rss_mb(), 2),
+    }
+
+
+def run_benchmarks(args, debug: bool = False):
+    selected = args.benchmarks.split(",") if args.benchmarks else BENCHMARKS
+    sizes = [int(s) for s in args.sizes.split(",")]
+    queries = fixture_queries()
+    themes = fixture_themes(fixture_posts())
+    rng = random.Random(args.seed)
+
+    engine = None
+    if {"expand_query_semantically", "rank_results_semantically"} & set(selected):
+        t0 = time.perf_counter()
+        engine = SemanticSearchEngine(
+            debug=False,
+            rerank_top_n=args.rerank_top_n or None,
+            rerank_budget_ms=args.rerank_budget_ms or None,
+            lexical_workers=args.lexical_workers,
+            analyzer=args.analyzer,
+        )
+        log_debug(debug, f"engine ready in {time.perf_counter() - t0:.2f}s")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "sizes": sizes,
+            "candidates": args.candidates,
+            "embed_samples": args.embed_samples,
+            "rerank_top_n": args.rerank_top_n,
+            "rerank_budget_ms": args.rerank_budget_ms,
+            "lexical_workers": args.lexical_workers,
+            "analyzer": args.analyzer,
+        },
+        "results": {},
+    }
+
+    for size in sizes:
+        corpus = make_corpus(size, args.seed)
+        log_debug(debug, f"corpus size={size} generated")
+        results = {}
+
+        if "clean_text" in selected:
+            results["clean_text"] = measure(clean_text, [p["content"] for p in corpus])
+
+        if "extract_tags_by_theme" in selected:
+            results["extract_tags_by_theme"] = measure(
+                lambda p: extract_tags_by_theme(p["title"], p["description"], themes),
+                corpus,
+            )
+
+        if "embed_text" in selected:
+            sample = corpus[: min(size, args.embed_samples)]
+            # Load the model outside of the measured loop
+            embed_text(["warmup"])
+            results["embed_text"] = measure(
+                lambda p: embed_text([p["title"], p["description"], p["content"]]),
+                sample,
+            )
+
+        if "expand_query_semantically" in selected:
+            rounds = max(1, args.query_rounds)
+            results["expand_query_semantically"] = measure(
+                engine.expand_query_semantically, queries * rounds
+            )
+
+        if "rank_results_semantically" in selected:
+            analyses = [engine.expand_query_semantically(q) for q in queries]
+            candidate_sets = [
+                [dict(p) for p in rng.sample(corpus, min(size, args.candidates))]
+                for _ in analyses
+            ]
+            results["rank_results_semantically"] = measure(
+                lambda pair: engine.rank_results_semantically(*pair),
+                list(zip(candidate_sets, analyses)),
+                items_per_call=min(size, args.candidates),
+            )
+
+        report["results"][str(size)] = results
+        log_debug(debug, f"size={size} done: {json.dumps(results)}")
+
+    if engine is not None:
+        engine.close()
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance: float):
+    """
+    Compare p50 latency and throughput against a stored baseline report.
+    Returns a list of regressions beyond `tolerance` (a fraction, e.g. 0.1).
+    """
+    regressions = []
+    for size, results in report["results"].items():
+        for name, current in results.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if not previous:
+                continue
+            delta = {
+                "p50_ms": (
+                    (current["p50_ms"] - previous["p50_ms"]) / previous["p50_ms"]
+                    if previous["p50_ms"]
+                    else 0.0
+                ),
+                "throughput_per_s": (
+                    (current["throughput_per_s"] - previous["throughput_per_s"])
+                    / previous["throughput_per_s"]
+                    if previous["throughput_per_s"]
+                    else 0.0
+                ),
+            }
+            current["baseline_delta"] = {k: round(v, 4) for k, v in delta.items()}
+            if delta["p50_ms"] > tolerance or delta["throughput_per_s"] < -tolerance:
+                regressions.append({"size": size, "benchmark": name, **delta})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Python hot paths")
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000,100000",
+        help="Comma-separated synthetic corpus sizes",
+    )
+    parser.add_argument(
+        "--benchmarks",
+        help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}",
+    )
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=30,
+        help="Candidates per query for rank_results_semantically",
+    )
+    parser.add_argument(
+        "--rerank-top-n",
+        type=int,
+        default=0,
+        help="Cascade reranker: encode only the top N candidates (0 = all)",
+    )
+    parser.add_argument(
+        "--rerank-budget-ms",
+        type=float,
+        default=0,
+        help="Cascade reranker latency budget (0 = none)",
+    )
+    parser.add_argument(
+        "--lexical-workers",
+        type=int,
+        default=0,
+        help="Processes for sharded lexical scoring (0 = serial)",
+    )
+    parser.add_argument(
+        "--analyzer",
+        choices=["spacy", "gazetteer"],
+        help="Query entity analyzer (default: QUERY_ANALYZER or spacy)",
+    )
+    parser.add_argument(
+        "--embed-samples",
+        type=int,
+        default=200,
+        help="Maximum posts embedded per corpus size",
+    )
+    parser.add_argument(
+        "--query-rounds",
+        type=int,
+        default=5,
+        help="How many times the fixture queries are expanded",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Corpus random seed")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="Baseline JSON report to diff against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed relative regression against the baseline",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    unknown = (
+        set(args.benchmarks.split(",")) - set(BENCHMARKS) if args.benchmarks else set()
+    )
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = run_benchmarks(args, debug)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        log_debug(debug, f"report written to {args.output}")
+    print(output)
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Wire Codec
+Compact JSON (orjson when installed, the standard library otherwise) and
+optional msgpack for the data the Python scripts exchange with the backend
+"""
+
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATS = ("json", "msgpack")
+
+
+def _default(obj):
+    """NumPy scalars and arrays that leak into analysis or score dicts"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def _require_msgpack():
+    if msgpack is None:
+        raise RuntimeError("msgpack format requested but msgpack is not installed")
+
+
+def dumps(obj, pretty: bool = False) -> bytes:
+    """UTF-8 JSON bytes, compact unless `pretty`"""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    if pretty:
+        text = json.dumps(obj, indent=2, ensure_ascii=False, default=_default)
+    else:
+        text = json.dumps(
+            obj, separators=(",", ":"), ensure_ascii=False, default=_default
+        )
+    return text.encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode(obj, fmt: str = "json", pretty: bool = False) -> bytes:
+    if fmt == "msgpack":
+        _require_msgpack()
+        return msgpack.packb(obj, default=_default, use_bin_type=True)
+    return dumps(obj, pretty)
+
+
+def decode(data: bytes, fmt: str = "json"):
+    if fmt == "msgpack":
+        _require_msgpack()
+        return msgpack.unpackb(data, raw=False)
+    return loads(data)
@@ -4,15 +4,20 @@ DB Service Script
 Connect to PostgreSQL DB and return the themes and tags
 """
 
+import argparse
+import json
 import os
 import sys
+import uuid
+from datetime import datetime
 from urllib.parse import urlparse
 
 import psycopg2
 from dotenv import load_dotenv
+from psycopg2.extras import execute_values
 
 
-def get_themes_and_tags():
+def get_connection():
     load_dotenv("../.env")
     db_url = os.getenv("DATABASE_URL")
     """
@@ -34,9 +39,189 @@ def get_themes_and_tags():
         params = dict(param.split("=") for param in parsed.query.split("&"))
         schema = params.get("schema")
 
-    conn = psycopg2.connect(
+    return psycopg2.connect(
         dbname=database, user=user, password=password, host=host, port=port
     )
+
+
+def get_themes_and_tags():
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT name, tags FROM themes")
     return cursor.fetchall()
+
+
+def get_post_titles():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT title FROM blog_posts WHERE title <> ''")
+    return [title for (title,) in cursor.fetchall()]
+
+
+def get_popular_queries(limit: int = 5000):
+    """Most frequent search queries as (query, count), case-insensitively grouped"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT MIN(query), COUNT(*) AS uses FROM search_queries "
+        "GROUP BY LOWER(TRIM(query)) ORDER BY uses DESC LIMIT %s",
+        (limit,),
+    )
+    return cursor.fetchall()
+
+
+def get_recent_queries(limit: int = 1000):
+    """The latest search queries, oldest first, in the order they were made"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT query FROM search_queries ORDER BY "createdAt" DESC LIMIT %s',
+        (limit,),
+    )
+    return [query for (query,) in reversed(cursor.fetchall())]
+
+
+BLOG_POST_COLUMNS = [
+    "id",
+    "title",
+    "description",
+    "content",
+    "author",
+    "url",
+    "publishedAt",
+    "source",
+    "themes",
+    "tags",
+    "createdAt",
+]
+
+
+def count_blog_posts(conn, after_id: str = ""):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM blog_posts WHERE id > %s", (after_id,))
+        return cursor.fetchone()[0]
+
+
+def iter_blog_post_batches(conn, after_id: str = "", batch_size: int = 500):
+    """
+    Stream blog posts ordered by id, after `after_id`, in lists of dicts.
+    Uses a server-side cursor so the table is never loaded whole.
+    """
+    columns = ", ".join(f'"{column}"' for column in BLOG_POST_COLUMNS)
+    with conn.cursor(name="blog_posts_stream") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(
+            f"SELECT {columns} FROM blog_posts WHERE id > %s ORDER BY id", (after_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(zip(BLOG_POST_COLUMNS, row)) for row in rows]
+
+
+UPSERT_BLOG_POSTS_SQL = """
+INSERT INTO blog_posts (
+    id, title, description, content, author, url, "publishedAt",
+    source, themes, tags, "createdAt", "updatedAt"
+)
+VALUES %s
+ON CONFLICT (url) DO UPDATE SET
+    title = EXCLUDED.title,
+    description = EXCLUDED.description,
+    content = EXCLUDED.content,
+    author = EXCLUDED.author,
+    "publishedAt" = EXCLUDED."publishedAt",
+    themes = EXCLUDED.themes,
+    tags = EXCLUDED.tags,
+    "updatedAt" = EXCLUDED."updatedAt"
+WHERE (
+    blog_posts.title, blog_posts.description, blog_posts.content,
+    blog_posts.author, blog_posts."publishedAt", blog_posts.themes, blog_posts.tags
+) IS DISTINCT FROM (
+    EXCLUDED.title, EXCLUDED.description, EXCLUDED.content,
+    EXCLUDED.author, EXCLUDED."publishedAt", EXCLUDED.themes, EXCLUDED.tags
+)
+RETURNING (xmax = 0) AS inserted
+"""
+
+
+def upsert_blog_posts(posts, source: str = None, conn=None, page_size: int = 500):
+    """
+    Upsert a batch of posts (as produced by fetch_rss.py) into blog_posts on
+    `url`, in one transaction, with the same field mapping as
+    RssService.saveBlogPost. Unchanged rows are left untouched.
+    Returns {"inserted", "updated", "skipped"} counts.
+    """
+    now = datetime.now()
+    rows = {}
+    skipped = 0
+    for post in posts:
+        url = post.get("url")
+        if not url:
+            skipped += 1
+            continue
+        if url in rows:
+            # ON CONFLICT cannot touch the same row twice in one statement
+            skipped += 1
+        rows[url] = (
+            uuid.uuid4().hex,
+            post.get("title") or "",
+            post.get("description"),
+            post.get("content"),
+            post.get("author"),
+            url,
+            post.get("publishedAt"),
+            source or post.get("source") or "",
+            post.get("themes") or [],
+            post.get("tags") or [],
+            now,
+            now,
+        )
+
+    if not rows:
+        return {"inserted": 0, "updated": 0, "skipped": skipped}
+
+    own_conn = conn is None
+    conn = conn or get_connection()
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                returned = execute_values(
+                    cursor,
+                    UPSERT_BLOG_POSTS_SQL,
+                    list(rows.values()),
+                    page_size=page_size,
+                    fetch=True,
+                )
+    finally:
+        if own_conn:
+            conn.close()
+
+    inserted = sum(1 for (was_inserted,) in returned if was_inserted)
+    updated = len(returned) - inserted
+    skipped += len(rows) - len(returned)
+    return {"inserted": inserted, "updated": updated, "skipped": skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blog post DB operations")
+    parser.add_argument(
+        "--upsert-posts",
+        required=True,
+        help="JSON file of posts from fetch_rss.py ('-' for stdin)",
+    )
+    parser.add_argument("--source", help="Override the posts' source name")
+
+    args = parser.parse_args()
+    if args.upsert_posts == "-":
+        posts = json.load(sys.stdin)
+    else:
+        with open(args.upsert_posts, "r") as f:
+            posts = json.load(f)
+
+    print(json.dumps(upsert_blog_posts(posts, args.source)))
+
+
+if __name__ == "__main__":
+    main()
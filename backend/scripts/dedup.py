@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Detection
+64-bit SimHash over word shingles of cleaned post text, with a persistent
+SQLite signature index banded for LSH lookups
+
+Two posts are near-duplicates when their fingerprints differ in at most
+`max_distance` bits. The fingerprint is split into `max_distance + 1` bands,
+so by the pigeonhole principle any such pair shares at least one band exactly
+and a candidate lookup is a handful of indexed equality queries.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+import metrics
+import numpy as np
+
+DEFAULT_MAX_DISTANCE = 3
+MIN_WORDS = 20
+SHINGLE_SIZE = 3
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + k]) for i in range(len(words) - k + 1)}
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of `text`, or 0 when it has no words"""
+    features = shingles(text)
+    if not features:
+        return 0
+    hashes = np.fromiter(
+        (
+            int.from_bytes(
+                hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            for f in features
+        ),
+        dtype="<u8",
+        count=len(features),
+    )
+    # One row of 64 bits per shingle, bit i of the hash in column i
+    bits = np.unpackbits(
+        hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little"
+    )
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(features)
+    packed = np.packbits(votes > 0, bitorder="little")
+    return int.from_bytes(packed.tobytes(), "little")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class DuplicateIndex:
+    def __init__(self, path: str, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.path = path
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"band{i} INTEGER NOT NULL" for i in range(self.bands))
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            f"url TEXT PRIMARY KEY, simhash INTEGER NOT NULL, {columns})"
+        )
+        for i in range(self.bands):
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS signatures_band{i} ON signatures (band{i})"
+            )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates ("
+            "url TEXT PRIMARY KEY, canonical_url TEXT NOT NULL, "
+            "distance INTEGER NOT NULL, detected_at TEXT NOT NULL)"
+        )
+
+    def _band_values(self, fingerprint: int):
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (i * self.band_bits)) & mask for i in range(self.bands)]
+
+    def find(self, url: str, fingerprint: int):
+        """
+        Closest indexed post within `max_distance` bits other than `url`
+        itself, as (canonical_url, distance), or None
+        """
+        bands = self._band_values(fingerprint)
+        where = " OR ".join(f"band{i} = ?" for i in range(self.bands))
+        best = None
+        for other_url, other in self._db.execute(
+            f"SELECT url, simhash FROM signatures WHERE ({where}) AND url != ?",
+            (*bands, url),
+        ):
+            distance = hamming(fingerprint, _unsigned(other))
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (other_url, distance)
+        return best
+
+    def add(self, url: str, fingerprint: int):
+        placeholders = ", ".join("?" for _ in range(self.bands + 2))
+        self._db.execute(
+            f"INSERT OR REPLACE INTO signatures VALUES ({placeholders})",
+            (url, _signed(fingerprint), *self._band_values(fingerprint)),
+        )
+
+    def link(self, url: str, canonical_url: str, distance: int):
+        """Record `url` as a near-duplicate of `canonical_url`"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO duplicates VALUES (?, ?, ?, ?)",
+            (url, canonical_url, distance, datetime.now().isoformat()),
+        )
+
+    def duplicates(self):
+        return [
+            {"url": url, "canonical_url": canonical, "distance": distance}
+            for url, canonical, distance in self._db.execute(
+                "SELECT url, canonical_url, distance FROM duplicates ORDER BY canonical_url"
+            )
+        ]
+
+    def check(self, url: str, text: str):
+        """
+        Register a post and return (canonical_url, distance) if it
+        near-duplicates an already indexed one. Posts too short to fingerprint
+        reliably are never flagged.
+        """
+        if not url or len(_WORD_RE.findall(text)) < MIN_WORDS:
+            return None
+        with metrics.span("dedup"):
+            fingerprint = simhash(text)
+            match = self.find(url, fingerprint)
+            if match is None:
+                self.add(url, fingerprint)
+                return None
+            self.link(url, *match)
+        metrics.incr("duplicates")
+        return match
+
+
+def open_index(path: str = None):
+    """DuplicateIndex at `path` or DEDUP_INDEX_PATH, or None when unset"""
+    path = path or os.environ.get("DEDUP_INDEX_PATH")
+    if not path:
+        return None
+    max_distance = int(os.environ.get("DEDUP_MAX_DISTANCE", DEFAULT_MAX_DISTANCE))
+    return DuplicateIndex(path, max_distance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the near-duplicate index")
+    parser.add_argument(
+        "--index",
+        default=os.environ.get("DEDUP_INDEX_PATH"),
+        required=not os.environ.get("DEDUP_INDEX_PATH"),
+        help="Signature index file",
+    )
+    args = parser.parse_args()
+    print(json.dumps(open_index(args.index).duplicates(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Embedding Micro-Batcher
+Asyncio dispatcher that groups concurrent single-text embedding requests
+into one `model.encode` call
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import metrics
+from embed_text import get_model
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[embed_batcher][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+class EmbeddingBatcher:
+    """
+    Collects `embed()` calls arriving within `window_ms` of the first queued
+    request, up to `max_batch_size`, and encodes them together. The blocking
+    encode runs in the default executor so the event loop keeps accepting
+    requests while a batch is in flight.
+    """
+
+    def __init__(
+        self,
+        window_ms: float = 5.0,
+        max_batch_size: int = 64,
+        debug: bool = False,
+        model=None,
+    ):
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self.debug = debug
+        self._model = model
+        self._queue = None
+        self._worker = None
+        self._batch = []
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker; requests still queued or in flight fail"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+            stopped = RuntimeError("embedding batcher stopped")
+            futures = [future for _, future in self._batch]
+            while not self._queue.empty():
+                futures.append(self._queue.get_nowait()[1])
+            for future in futures:
+                if not future.done():
+                    future.set_exception(stopped)
+            self._batch = []
+
+    async def embed(self, text: str):
+        """Normalized embedding for `text` as a list of floats"""
+        # Checked here so one bad request can't fail the batch it lands in
+        if not isinstance(text, str):
+            raise TypeError(f"text must be a string, not {type(text).__name__}")
+        if self._worker is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch = batch = [await self._queue.get()]
+            deadline = loop.time() + self.window_ms / 1000
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._dispatch(loop, batch)
+            self._batch = []
+
+    async def _dispatch(self, loop, batch):
+        texts = [text for text, _ in batch]
+        metrics.incr("batches")
+        metrics.incr("batched_texts", len(texts))
+        try:
+            vectors = await loop.run_in_executor(None, self._encode, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        log_debug(self.debug, f"encoded batch of {len(texts)}")
+        for (_, future), vec in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vec.tolist())
+
+    def _encode(self, texts):
+        model = self._model or get_model(self.debug)
+        with metrics.span("encode"):
+            return model.encode(texts, normalize_embeddings=True)
+
+
+async def _handle_client(batcher: EmbeddingBatcher, reader, writer):
+    """
+    One JSON request per line: {"id": ..., "text": ...}
+    One JSON response per line: {"id": ..., "embedding": [...]}
+    """
+    pending = set()
+    write_lock = asyncio.Lock()
+
+    async def respond(request):
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise ValueError('request must be an object like {"text": ...}')
+            embedding = await batcher.embed(request["text"])
+            response = {"id": request_id, "embedding": embedding}
+        except Exception as e:
+            response = {"id": request_id, "error": str(e)}
+        async with write_lock:
+            writer.write((json.dumps(response) + "\n").encode("utf-8"))
+            await writer.drain()
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            async with write_lock:
+                writer.write((json.dumps({"error": str(e)}) + "\n").encode("utf-8"))
+            continue
+        task = asyncio.create_task(respond(request))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    if pending:
+        await asyncio.gather(*pending)
+    writer.close()
+
+
+async def serve(args, debug: bool = False):
+    batcher = EmbeddingBatcher(args.window_ms, args.max_batch_size, debug)
+    # Load the model before accepting connections
+    get_model(debug)
+    await batcher.start()
+    if args.socket:
+        server = await asyncio.start_unix_server(
+            lambda r, w: _handle_client(batcher, r, w), path=args.socket
+        )
+        where = args.socket
+    else:
+        server = await asyncio.start_server(
+            lambda r, w: _handle_client(batcher, r, w), args.host, args.port
+        )
+        where = f"{args.host}:{args.port}"
+    log_debug(debug, f"listening on {where}")
+    async with server:
+        await server.serve_forever()
+
+
+async def run_demo(args, debug: bool = False):
+    """Fire `--concurrency` simultaneous requests and report batching effect"""
+    batcher = EmbeddingBatcher(args.window_ms, args.max_batch_size, debug)
+    get_model(debug)
+    await batcher.start()
+    texts = [f"{args.query} #{i}" for i in range(args.concurrency)]
+    t0 = time.perf_counter()
+    latencies = []
+
+    async def one(text):
+        t = time.perf_counter()
+        await batcher.embed(text)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    await asyncio.gather(*(one(text) for text in texts))
+    total = time.perf_counter() - t0
+    await batcher.stop()
+    latencies.sort()
+    print(
+        json.dumps(
+            {
+                "requests": len(texts),
+                "total_s": round(total, 4),
+                "throughput_per_s": round(len(texts) / total, 2),
+                "max_latency_ms": round(latencies[-1], 2),
+            },
+            indent=2,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching embedding server")
+    parser.add_argument(
+        "--window-ms",
+        type=float,
+        default=float(os.environ.get("EMBED_BATCH_WINDOW_MS", "5")),
+        help="How long to wait for more requests after the first one",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=int(os.environ.get("EMBED_BATCH_MAX_SIZE", "64")),
+        help="Maximum texts per encode call",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port")
+    parser.add_argument("--socket", help="Listen on this Unix socket instead")
+    parser.add_argument(
+        "--demo",
+        action="store_true",
+        help="Run a local concurrency demo instead of serving",
+    )
+    parser.add_argument("--query", default="semantic search", help="Demo query")
+    parser.add_argument("--concurrency", type=int, default=64, help="Demo requests")
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    if args.demo:
+        asyncio.run(run_demo(args, debug))
+    else:
+        asyncio.run(serve(args, debug))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,21 @@ import os
 import sys
 import time
 
-# Embeddings
-from sentence_transformers import SentenceTransformer
+import metrics
+import numpy as np
+from embedding_cache import encode_queries
+from model_registry import MODEL_NAME, load_model
+
+# How long posts are embedded: "truncate" keeps the head that fits the
+# model's token budget, "pool" mean-pools up to MAX_CHUNKS windows
+LONG_TEXT_MODE = os.environ.get("EMBED_LONG_TEXT_MODE", "truncate")
+MAX_CHUNKS = int(os.environ.get("EMBED_MAX_CHUNKS", "4"))
+# Average word pieces per whitespace word, used to size pooling windows
+WORD_PIECES_PER_WORD = 1.3
+# Stored next to vectors so a corpus-wide re-embed knows what produced them
+EMBEDDING_VERSION = os.environ.get(
+    "EMBEDDING_VERSION", f"{MODEL_NAME}:{LONG_TEXT_MODE}:{MAX_CHUNKS}"
+)
 
 # Lazy global model
 _model = None
@@ -26,29 +39,131 @@ def get_model(debug: bool = False):
     global _model
     if _model is None:
         t0 = time.time()
-        log_debug(
-            debug, "loading embedding model: sentence-transformers/all-MiniLM-L6-v2 ..."
-        )
-        _model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+        log_debug(debug, f"loading embedding model: {MODEL_NAME} ...")
+        with metrics.span("model_load"):
+            # Loaded lazily so cached query embeddings never import torch
+            _model = load_model(debug)
         log_debug(debug, f"model loaded in {time.time() - t0:.2f}s")
     return _model
 
 
-def embed_text(texts, debug: bool = False):
+def trim_words(text: str, max_words: int):
     """
-    Embed an array of strings (e.g., [title, description, content]) into a vector.
+    First `max_words` whitespace-separated words of `text`, without splitting
+    the rest of it. Every word yields at least one word piece, so keeping
+    `max_seq_length` words never drops a token the model would have kept.
+    """
+    words = text.split(maxsplit=max_words)
+    return " ".join(words[:max_words])
+
+
+def prepare_text(texts, max_words: int, mode: str = "truncate", max_chunks: int = 1):
+    """
+    Cheaply fit [title, description, content] to the model's token budget
+    before tokenization. Title and description come first so they always
+    survive trimming. In "pool" mode, returns up to `max_chunks` windows:
+    the head (title, description, start of content) plus content windows.
     """
-    model = get_model(debug)
     # Filter out empty/None strings, join with space
-    combined = " ".join([t for t in texts if t]).strip()
-    if not combined:
+    head = trim_words(" ".join([t for t in texts if t]), max_words)
+    if not head:
+        return []
+    if mode != "pool" or max_chunks <= 1:
+        return [head]
+
+    window = max(1, int(max_words / WORD_PIECES_PER_WORD))
+    head = trim_words(head, window)
+    content = texts[-1] or ""
+    lead = len(" ".join([t for t in texts[:-1] if t]).split())
+    words = content.split(maxsplit=lead + window * max_chunks)[
+        max(0, window - lead) : window * max_chunks
+    ]
+    chunks = [head]
+    for start in range(0, len(words), window):
+        if len(chunks) == max_chunks:
+            break
+        chunks.append(" ".join(words[start : start + window]))
+    return chunks
+
+
+def embed_vector(texts, debug: bool = False, mode: str = None):
+    """
+    Embed an array of strings (e.g., [title, description, content]) into a
+    float32 NumPy vector, or None when there is no text.
+    """
+    model = get_model(debug)
+    mode = mode or LONG_TEXT_MODE
+    chunks = prepare_text(texts, model.max_seq_length, mode, MAX_CHUNKS)
+    if not chunks:
         return None
-    vec = model.encode(combined, normalize_embeddings=True)
+    metrics.incr("embed_texts")
+    metrics.incr("embed_chars", sum(len(chunk) for chunk in chunks))
+    with metrics.span("encode"):
+        if len(chunks) == 1:
+            vec = model.encode(chunks[0], normalize_embeddings=True)
+        else:
+            pooled = model.encode(chunks, normalize_embeddings=True).mean(axis=0)
+            vec = pooled / max(np.linalg.norm(pooled), 1e-12)
     if debug:
         log_debug(
             True,
             f"embedding dims={len(vec)} range=({float(min(vec)):.4f},{float(max(vec)):.4f})",
         )
+    return vec.astype(np.float32, copy=False)
+
+
+def embed_many(items, debug: bool = False, mode: str = None, batch_size: int = 64):
+    """
+    Embed many [title, description, content] lists with one batched encode
+    call. Returns one float32 vector (or None for an empty item) per item.
+    """
+    model = get_model(debug)
+    mode = mode or LONG_TEXT_MODE
+    groups = [
+        prepare_text(texts, model.max_seq_length, mode, MAX_CHUNKS) for texts in items
+    ]
+    chunks = [chunk for group in groups for chunk in group]
+    if not chunks:
+        return [None] * len(items)
+    metrics.incr("embed_texts", sum(1 for group in groups if group))
+    metrics.incr("embed_chars", sum(len(chunk) for chunk in chunks))
+    with metrics.span("encode"):
+        encoded = model.encode(
+            chunks, batch_size=batch_size, normalize_embeddings=True
+        ).astype(np.float32, copy=False)
+
+    vectors, start = [], 0
+    for group in groups:
+        if not group:
+            vectors.append(None)
+            continue
+        vec = encoded[start]
+        if len(group) > 1:
+            pooled = encoded[start : start + len(group)].mean(axis=0)
+            vec = pooled / max(np.linalg.norm(pooled), 1e-12)
+        vectors.append(vec)
+        start += len(group)
+    return vectors
+
+
+def embed_text(texts, debug: bool = False, mode: str = None):
+    """
+    Embed an array of strings (e.g., [title, description, content]) into a vector.
+    """
+    vec = embed_vector(texts, debug, mode)
+    return vec.tolist() if vec is not None else None
+
+
+def embed_query(query: str, debug: bool = False):
+    """
+    Embed a search query through the shared query-embedding cache.
+    The model is only loaded on a cache miss.
+    """
+    query = query.strip()
+    if not query:
+        return None
+
+    vec = encode_queries(lambda: get_model(debug), MODEL_NAME, [query])[0]
     return vec.tolist()
 
 
@@ -62,7 +177,7 @@ def main():
     args = parser.parse_args()
     debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
 
-    embeddings = embed_text([args.query], debug)
+    embeddings = embed_query(args.query, debug)
     print(json.dumps(embeddings, indent=2))
 
 
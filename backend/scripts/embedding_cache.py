@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Query Embedding Cache
+LRU cache of query embeddings keyed by model and text, shared between the
+vector search path (embed_text.py) and semantic reranking (semantic_search.py)
+
+Each script runs as a short-lived process, so the in-memory LRU is backed by
+a small SQLite file that every process reads and writes. Set
+EMBEDDING_CACHE_PATH to move it, or to "off" to keep the cache in memory only.
+One cache can be shared by threads (loadgen.py drives a single engine from
+many); a lock serializes the LRU and the SQLite connection.
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+import numpy as np
+
+DEFAULT_CAPACITY = 10000
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "blog_search_embeddings.sqlite")
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha1(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, path: str = None):
+        self.capacity = capacity
+        self.path = path
+        self._memory = OrderedDict()
+        self._db = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            try:
+                self._db = sqlite3.connect(
+                    path, timeout=5, isolation_level=None, check_same_thread=False
+                )
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS embeddings_last_used "
+                    "ON embeddings (last_used)"
+                )
+            except sqlite3.Error as e:
+                print(f"Embedding cache disabled for {path}: {str(e)}", file=sys.stderr)
+                self._db = None
+
+    def get(self, model_name: str, text: str):
+        """Cached vector for (model_name, text), or None"""
+        key = cache_key(model_name, text)
+        with self._lock:
+            vec = self._memory.get(key)
+            if vec is not None:
+                self._memory.move_to_end(key)
+            elif self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        vec = np.frombuffer(row[0], dtype=np.float32)
+                        self._db.execute(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                            (time.time(), key),
+                        )
+                        self._remember(key, vec)
+                except sqlite3.Error:
+                    vec = None
+
+            if vec is None:
+                self.misses += 1
+                metrics.incr("embedding_cache_misses")
+            else:
+                self.hits += 1
+                metrics.incr("embedding_cache_hits")
+        return vec
+
+    def put(self, model_name: str, text: str, vec):
+        key = cache_key(model_name, text)
+        vec = np.asarray(vec, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vec)
+            if self._db is not None:
+                self._store(key, vec)
+
+    def _store(self, key: str, vec):
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) "
+                "VALUES (?, ?, ?)",
+                (key, vec.tobytes(), time.time()),
+            )
+            (count,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.capacity:
+                evicted = self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.capacity,),
+                ).rowcount
+                self.evictions += evicted
+                metrics.incr("embedding_cache_evictions", evicted)
+        except sqlite3.Error:
+            pass
+
+    def _remember(self, key: str, vec):
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+            if self._db is None:
+                self.evictions += 1
+                metrics.incr("embedding_cache_evictions")
+
+    def stats(self):
+        with self._lock:
+            size = len(self._memory)
+            if self._db is not None:
+                try:
+                    (size,) = self._db.execute(
+                        "SELECT COUNT(*) FROM embeddings"
+                    ).fetchone()
+                except sqlite3.Error:
+                    pass
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": size,
+            "capacity": self.capacity,
+            "path": self.path,
+        }
+
+
+_cache = None
+
+
+def get_cache() -> EmbeddingCache:
+    """Process-wide cache configured from EMBEDDING_CACHE_PATH / _CAPACITY"""
+    global _cache
+    if _cache is None:
+        path = os.environ.get("EMBEDDING_CACHE_PATH", DEFAULT_PATH)
+        capacity = int(os.environ.get("EMBEDDING_CACHE_CAPACITY", DEFAULT_CAPACITY))
+        _cache = EmbeddingCache(capacity, None if path == "off" else path)
+    return _cache
+
+
+def encode_queries(load_model, model_name: str, texts):
+    """
+    Normalized embeddings for `texts`, served from the cache where possible.
+    All misses are encoded together in a single `model.encode` call;
+    `load_model` is only called when there is at least one miss.
+    """
+    cache = get_cache()
+    vectors = [cache.get(model_name, text) for text in texts]
+    missing = sorted({text for text, vec in zip(texts, vectors) if vec is None})
+    if missing:
+        model = load_model()
+        with metrics.span("encode"):
+            encoded = model.encode(missing, normalize_embeddings=True)
+        fresh = dict(zip(missing, encoded))
+        for text in missing:
+            cache.put(model_name, text, fresh[text])
+        vectors = [
+            vec if vec is not None else np.asarray(fresh[text], dtype=np.float32)
+            for text, vec in zip(texts, vectors)
+        ]
+    return vectors
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Elasticsearch Bulk Loader
+Builds `_bulk` NDJSON for blog posts and sends it in size-bounded chunks,
+retrying failed requests and the items Elasticsearch rejects as temporarily
+unavailable
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import requests
+
+DEFAULT_INDEX = "blog-posts"
+DEFAULT_CHUNK_BYTES = 5 * 1024 * 1024
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+# Fields mirrored from ElasticsearchService.indexBlogPost
+SOURCE_FIELDS = [
+    "title",
+    "description",
+    "content",
+    "author",
+    "url",
+    "source",
+    "tags",
+    "themes",
+    "publishedAt",
+    "createdAt",
+    "embedding",
+]
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[es_bulk][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def doc_id(url: str) -> str:
+    """Deterministic document id derived from the post URL"""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def to_bulk_lines(
+    posts, index: str = DEFAULT_INDEX, fields=SOURCE_FIELDS, id_field: str = None
+):
+    """
+    Yield (action line, source line) pairs for each post with a URL. Document
+    ids come from the post's `id_field` when given (the database id used by
+    ElasticsearchService), otherwise from the URL.
+    """
+    created_at = datetime.now().isoformat()
+    for post in posts:
+        if not post.get("url"):
+            continue
+        source = {field: post.get(field) for field in fields}
+        source["createdAt"] = source["createdAt"] or created_at
+        _id = post[id_field] if id_field else doc_id(post["url"])
+        action = {"index": {"_index": index, "_id": _id}}
+        yield (
+            json.dumps(action, separators=(",", ":")),
+            json.dumps(source, separators=(",", ":"), ensure_ascii=False),
+        )
+
+
+def write_bulk(posts, out, index: str = DEFAULT_INDEX) -> int:
+    """Write bulk NDJSON for `posts` to the text stream `out`"""
+    count = 0
+    for action, source in to_bulk_lines(posts, index):
+        out.write(action + "\n")
+        out.write(source + "\n")
+        count += 1
+    return count
+
+
+def read_pairs(lines):
+    """Group an NDJSON bulk body back into (action, source) pairs"""
+    pending = None
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line:
+            continue
+        if pending is None:
+            pending = line
+        else:
+            yield pending, line
+            pending = None
+    if pending is not None:
+        raise ValueError("bulk body ends with an action line without a source")
+
+
+def chunk_pairs(pairs, max_bytes: int = DEFAULT_CHUNK_BYTES):
+    """Split (action, source) pairs into chunks whose body stays under max_bytes"""
+    chunk, size = [], 0
+    for action, source in pairs:
+        pair_size = len(action.encode("utf-8")) + len(source.encode("utf-8")) + 2
+        if chunk and size + pair_size > max_bytes:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append((action, source))
+        size += pair_size
+    if chunk:
+        yield chunk
+
+
+class BulkLoader:
+    def __init__(
+        self,
+        node: str,
+        username: str = None,
+        password: str = None,
+        max_retries: int = 3,
+        backoff_s: float = 0.5,
+        timeout_s: float = 30,
+        debug: bool = False,
+    ):
+        self.url = node.rstrip("/") + "/_bulk"
+        self.session = requests.Session()
+        if username:
+            self.session.auth = (username, password or "")
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+        self.debug = debug
+
+    def _post(self, chunk):
+        """
+        (pair, status, error, retryable) for each failed item. When the whole
+        request fails (connection error, timeout, non-2xx or unreadable
+        response) every item is returned as retryable.
+        """
+        body = "".join(f"{action}\n{source}\n" for action, source in chunk)
+        try:
+            response = self.session.post(
+                self.url,
+                data=body.encode("utf-8"),
+                headers={"Content-Type": "application/x-ndjson"},
+                timeout=self.timeout_s,
+            )
+            if response.status_code >= 300:
+                status, error = response.status_code, response.text[:200]
+            else:
+                data = response.json()
+                status = error = None
+        except (requests.ConnectionError, requests.Timeout, ValueError) as e:
+            status, error = None, f"{type(e).__name__}: {str(e)}"
+        if error is not None:
+            return [(pair, status, error, True) for pair in chunk]
+
+        if not data.get("errors"):
+            return []
+        failed = []
+        for pair, item in zip(chunk, data.get("items", [])):
+            result = next(iter(item.values()))
+            status = result.get("status", 200)
+            if status >= 300:
+                failed.append(
+                    (pair, status, result.get("error"), status in RETRYABLE_STATUSES)
+                )
+        return failed
+
+    def send_chunk(self, chunk):
+        """
+        Send one chunk, resending failed requests and retryable item
+        failures with exponential backoff
+        """
+        pending, failures, retries = chunk, [], 0
+        while True:
+            failed = self._post(pending)
+            failures.extend(f for f in failed if not f[3])
+            rejected = [f for f in failed if f[3]]
+            if not rejected:
+                break
+            if retries == self.max_retries:
+                failures.extend(rejected)
+                break
+            pending = [pair for pair, _, _, _ in rejected]
+            log_debug(
+                self.debug,
+                f"{len(rejected)} items rejected, retry {retries + 1}/{self.max_retries}",
+            )
+            time.sleep(self.backoff_s * (2**retries))
+            retries += 1
+        return {
+            "sent": len(chunk),
+            "failed": len(failures),
+            "retries": retries,
+            "errors": [
+                {"status": status, "error": error} for _, status, error, _ in failures
+            ][:10],
+        }
+
+    def load(self, pairs, max_bytes: int = DEFAULT_CHUNK_BYTES):
+        """Send all pairs and return aggregated counts"""
+        summary = {"requests": 0, "sent": 0, "failed": 0, "retries": 0, "errors": []}
+        for chunk in chunk_pairs(pairs, max_bytes):
+            result = self.send_chunk(chunk)
+            summary["requests"] += 1 + result["retries"]
+            summary["sent"] += result["sent"]
+            summary["failed"] += result["failed"]
+            summary["retries"] += result["retries"]
+            summary["errors"] = (summary["errors"] + result["errors"])[:10]
+            log_debug(self.debug, f"chunk done: {result}")
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send bulk NDJSON to Elasticsearch")
+    parser.add_argument("--file", help="Bulk NDJSON file (default: stdin)")
+    parser.add_argument(
+        "--node",
+        default=os.environ.get("ELASTICSEARCH_NODE", "http://localhost:9200"),
+        help="Elasticsearch node URL",
+    )
+    parser.add_argument("--username", default=os.environ.get("ELASTICSEARCH_USERNAME"))
+    parser.add_argument("--password", default=os.environ.get("ELASTICSEARCH_PASSWORD"))
+    parser.add_argument(
+        "--chunk-bytes",
+        type=int,
+        default=DEFAULT_CHUNK_BYTES,
+        help="Maximum bytes per _bulk request",
+    )
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    loader = BulkLoader(
+        args.node,
+        args.username,
+        args.password,
+        max_retries=args.max_retries,
+        debug=debug,
+    )
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            summary = loader.load(read_pairs(f), args.chunk_bytes)
+    else:
+        summary = loader.load(read_pairs(sys.stdin), args.chunk_bytes)
+
+    print(json.dumps(summary, indent=2))
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Adaptive Feed Scheduler
+Learns each feed's publishing cadence from its entry timestamps and previous
+poll outcomes, and decides which feeds are due for a fetch
+
+A feed is polled at a fraction of its median gap between posts, clamped to
+[MIN_INTERVAL_S, MAX_INTERVAL_S]. Every poll that brings nothing new (a 304 or
+no entry newer than the last one seen) stretches the interval by
+UNCHANGED_BACKOFF, and consecutive errors double it, up to MAX_INTERVAL_S.
+State lives in a small SQLite file shared by fetch_rss.py runs.
+"""
+
+import argparse
+import calendar
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+MIN_INTERVAL_S = float(os.environ.get("FEED_MIN_INTERVAL_S", str(15 * 60)))
+MAX_INTERVAL_S = float(os.environ.get("FEED_MAX_INTERVAL_S", str(24 * 3600)))
+DEFAULT_INTERVAL_S = 3600.0
+# Poll twice per typical gap between posts
+CADENCE_FRACTION = 0.5
+UNCHANGED_BACKOFF = 1.5
+# Only the most recent entries describe the current cadence
+CADENCE_WINDOW = 20
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[feed_scheduler][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def entry_timestamps(entries):
+    """Unix timestamps of feedparser entries that carry a publish/update date"""
+    timestamps = []
+    for entry in entries:
+        parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+        if parsed:
+            timestamps.append(calendar.timegm(parsed))
+    return timestamps
+
+
+def estimate_cadence(timestamps):
+    """Median gap in seconds between the most recent distinct entries, or None"""
+    recent = sorted(set(timestamps))[-CADENCE_WINDOW:]
+    gaps = [b - a for a, b in zip(recent, recent[1:])]
+    if not gaps:
+        return None
+    return float(statistics.median(gaps))
+
+
+def _clamp(seconds: float) -> float:
+    return max(MIN_INTERVAL_S, min(MAX_INTERVAL_S, seconds))
+
+
+def next_interval(cadence_s, unchanged: int, failures: int) -> float:
+    """Seconds until the next poll given the cadence and the outcome streaks"""
+    base = DEFAULT_INTERVAL_S if cadence_s is None else cadence_s * CADENCE_FRACTION
+    interval = _clamp(base) * (UNCHANGED_BACKOFF**unchanged) * (2**failures)
+    return _clamp(interval)
+
+
+class FeedSchedule:
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS feeds ("
+            "url TEXT PRIMARY KEY, cadence_s REAL, last_entry_at REAL, "
+            "etag TEXT, last_modified TEXT, "
+            "unchanged INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0, "
+            "last_poll REAL, next_due REAL NOT NULL DEFAULT 0)"
+        )
+
+    def _row(self, url: str):
+        cursor = self._db.execute("SELECT * FROM feeds WHERE url = ?", (url,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip((c[0] for c in cursor.description), row))
+
+    def _save(self, state):
+        columns = list(state)
+        self._db.execute(
+            f"INSERT OR REPLACE INTO feeds ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})",
+            [state[c] for c in columns],
+        )
+
+    def validators(self, url: str):
+        """(etag, last_modified) from the last successful poll, for a conditional GET"""
+        state = self._row(url)
+        if state is None:
+            return None, None
+        return state["etag"], state["last_modified"]
+
+    def record_poll(
+        self,
+        url: str,
+        timestamps=(),
+        etag: str = None,
+        last_modified: str = None,
+        not_modified: bool = False,
+        now: float = None,
+    ):
+        """Record a successful poll and return the feed's new state"""
+        now = time.time() if now is None else now
+        state = self._row(url) or {"url": url, "unchanged": 0}
+        newest = max(timestamps, default=None)
+        is_new = not not_modified and (
+            newest is not None
+            and (state.get("last_entry_at") is None or newest > state["last_entry_at"])
+        )
+        if not not_modified:
+            cadence = estimate_cadence(timestamps)
+            if cadence is not None:
+                state["cadence_s"] = cadence
+            state["etag"], state["last_modified"] = etag, last_modified
+        if newest is not None and is_new:
+            state["last_entry_at"] = newest
+        state["unchanged"] = 0 if is_new else state["unchanged"] + 1
+        state["failures"] = 0
+        state["last_poll"] = now
+        state["next_due"] = now + next_interval(
+            state.get("cadence_s"), state["unchanged"], 0
+        )
+        self._save(state)
+        return state
+
+    def record_error(self, url: str, now: float = None):
+        """Record a failed poll, backing off exponentially"""
+        now = time.time() if now is None else now
+        state = self._row(url) or {"url": url, "unchanged": 0, "failures": 0}
+        state["failures"] += 1
+        state["last_poll"] = now
+        state["next_due"] = now + next_interval(
+            state.get("cadence_s"), state["unchanged"], state["failures"]
+        )
+        self._save(state)
+        return state
+
+    def due(self, urls, now: float = None):
+        """The subset of `urls` due for a poll, most overdue first; unknown feeds are due"""
+        now = time.time() if now is None else now
+        next_due = dict(self._db.execute("SELECT url, next_due FROM feeds"))
+        due = [url for url in urls if next_due.get(url, 0) <= now]
+        return sorted(due, key=lambda url: next_due.get(url, 0))
+
+    def states(self):
+        cursor = self._db.execute("SELECT * FROM feeds ORDER BY next_due")
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+
+def open_schedule(path: str = None):
+    """FeedSchedule at `path` or FEED_SCHEDULE_PATH, or None when unset"""
+    path = path or os.environ.get("FEED_SCHEDULE_PATH")
+    if not path:
+        return None
+    return FeedSchedule(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive feed polling schedule")
+    parser.add_argument(
+        "--state",
+        default=os.environ.get("FEED_SCHEDULE_PATH"),
+        required=not os.environ.get("FEED_SCHEDULE_PATH"),
+        help="Schedule state file",
+    )
+    parser.add_argument(
+        "--due",
+        action="store_true",
+        help="Read a JSON list of feed URLs from stdin and print the ones due now",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+    schedule = open_schedule(args.state)
+
+    if not args.due:
+        print(json.dumps(schedule.states(), indent=2))
+        return
+
+    urls = json.load(sys.stdin)
+    due = schedule.due(urls)
+    log_debug(debug, f"{len(due)} of {len(urls)} feeds due")
+    print(json.dumps(due))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Feed Snapshot Store
+Records raw feed responses (body and headers) into a compressed zip archive
+and replays them through the exact same parsing, cleaning, tagging and
+embedding path without network access
+
+Controlled by FEED_SNAPSHOT_MODE ("record" or "replay") and
+FEED_SNAPSHOT_PATH (the archive file). The themes table is recorded too, so
+replay needs neither the network nor the database.
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import warnings
+import zipfile
+from datetime import datetime
+
+MODE = os.environ.get("FEED_SNAPSHOT_MODE", "")
+PATH = os.environ.get("FEED_SNAPSHOT_PATH", "feed_snapshots.zip")
+
+THEMES_ENTRY = "themes.json"
+# Archives this process already knows to hold the themes
+_themes_saved = set()
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[feed_snapshot][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def recording() -> bool:
+    return MODE == "record"
+
+
+def replaying() -> bool:
+    return MODE == "replay"
+
+
+def _key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def _write_entries(entries, path: str = None, once: bool = False):
+    """
+    Append entries to the archive under an exclusive lock, so concurrent
+    fetch_rss.py processes can record into the same file. A URL recorded
+    twice keeps both copies; readers see the latest. With `once`, entries
+    whose name is already in the archive are skipped.
+    """
+    path = path or PATH
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # "Duplicate name"
+            with zipfile.ZipFile(path, "a", compression=zipfile.ZIP_DEFLATED) as zf:
+                existing = set(zf.namelist()) if once else ()
+                for name, data in entries:
+                    if name in existing:
+                        continue
+                    if hasattr(data, "read"):
+                        # Spooled bodies are copied without reading them whole
+                        data.seek(0)
+                        with zf.open(name, "w") as dst:
+                            shutil.copyfileobj(data, dst)
+                        data.seek(0)
+                    else:
+                        zf.writestr(name, data)
+
+
+def save_response(url: str, result, path: str = None):
+    """Record the feed_http.FetchResult fetched for `url`"""
+    key = _key(url)
+    meta = {
+        "url": url,
+        "final_url": result.url,
+        "status": result.status,
+        "headers": result.headers,
+        "recorded_at": datetime.now().isoformat(),
+    }
+    _write_entries(
+        [(f"{key}.json", json.dumps(meta)), (f"{key}.body", result.body)], path
+    )
+
+
+def load_response(url: str, path: str = None):
+    """(meta, body) recorded for `url`, or None"""
+    path = path or PATH
+    if not os.path.exists(path):
+        return None
+    key = _key(url)
+    with zipfile.ZipFile(path, "r") as zf:
+        try:
+            meta = json.loads(zf.read(f"{key}.json"))
+            body = zf.read(f"{key}.body")
+        except KeyError:
+            return None
+    return meta, body
+
+
+def save_themes(themes, path: str = None):
+    """Record the themes table, once per archive"""
+    path = path or PATH
+    if path in _themes_saved:
+        return
+    _write_entries(
+        [(THEMES_ENTRY, json.dumps([list(t) for t in themes]))], path, once=True
+    )
+    _themes_saved.add(path)
+
+
+def load_themes(path: str = None):
+    """Recorded themes as (name, tags) tuples, or None"""
+    path = path or PATH
+    if not os.path.exists(path):
+        return None
+    with zipfile.ZipFile(path, "r") as zf:
+        try:
+            return [tuple(t) for t in json.loads(zf.read(THEMES_ENTRY))]
+        except KeyError:
+            return None
+
+
+def list_recorded(path: str = None):
+    """Latest recording metadata for every URL in the archive"""
+    path = path or PATH
+    recorded = {}
+    with zipfile.ZipFile(path, "r") as zf:
+        for name in zf.namelist():
+            if name.endswith(".json") and name != THEMES_ENTRY:
+                meta = json.loads(zf.read(name))
+                recorded[meta["url"]] = meta
+    return sorted(recorded.values(), key=lambda m: m["url"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay feed snapshots")
+    parser.add_argument("--archive", default=PATH, help="Snapshot archive file")
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="Run every recorded feed through fetch_rss_feed and report throughput",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+    recorded = list_recorded(args.archive)
+
+    if not args.replay:
+        print(json.dumps(recorded, indent=2))
+        return
+
+    # Switch the imported module (not this __main__ copy) to replay mode
+    import feed_snapshot
+    from fetch_rss import fetch_rss_feed
+
+    feed_snapshot.MODE, feed_snapshot.PATH = "replay", args.archive
+
+    report = {"feeds": [], "posts": 0}
+    t0 = time.perf_counter()
+    for meta in recorded:
+        t_feed = time.perf_counter()
+        posts = fetch_rss_feed(meta["url"], "replay", debug)
+        elapsed = time.perf_counter() - t_feed
+        report["feeds"].append(
+            {"url": meta["url"], "posts": len(posts), "seconds": round(elapsed, 4)}
+        )
+        report["posts"] += len(posts)
+        log_debug(
+            debug, f"replayed {meta['url']}: {len(posts)} posts in {elapsed:.2f}s"
+        )
+    total = time.perf_counter() - t0
+    report["seconds"] = round(total, 4)
+    report["posts_per_s"] = round(report["posts"] / total, 2) if total else 0.0
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Streaming Feed Reader
+Incremental RSS/Atom parsing for very large feeds: entries are yielded one at
+a time as lxml finishes them and released once the caller moves on, so peak
+memory is bounded by one entry instead of the whole feed
+
+Entries come out as feedparser.FeedParserDict objects with the fields
+fetch_rss.py reads (title, description, summary, link, author, content,
+published_parsed, updated_parsed). Input lxml can't parse is handed to
+feedparser instead, skipping the entries already yielded.
+"""
+
+import argparse
+import email.utils
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import urljoin
+
+import feedparser
+import metrics
+from lxml import etree
+
+# Feeds at least this large are parsed incrementally
+MIN_BYTES = int(os.environ.get("FEED_STREAM_MIN_BYTES", str(4 * 1024 * 1024)))
+# Downloaded bodies stay in memory up to this size, then spill to disk
+SPOOL_BYTES = int(os.environ.get("FEED_SPOOL_BYTES", str(1024 * 1024)))
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+ATOM03_NS = "http://purl.org/atom/ns#"
+RSS1_NS = "http://purl.org/rss/1.0/"
+DC_NS = "http://purl.org/dc/elements/1.1/"
+CONTENT_NS = "http://purl.org/rss/1.0/modules/content/"
+
+ENTRY_TAGS = (
+    "item",
+    f"{{{RSS1_NS}}}item",
+    f"{{{ATOM_NS}}}entry",
+    f"{{{ATOM03_NS}}}entry",
+)
+ATOM_NAMESPACES = (ATOM_NS, ATOM03_NS)
+
+
+class FeedParseError(Exception):
+    pass
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[feed_stream][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def parse_date(value: str):
+    """RFC 822 (RSS) or ISO 8601 (Atom) date as a UTC struct_time, or None"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).timetuple()
+
+
+def _text(element) -> str:
+    return "".join(element.itertext()).strip()
+
+
+def _split(tag: str):
+    if tag.startswith("{"):
+        ns, _, local = tag[1:].partition("}")
+        return ns, local
+    return "", tag
+
+
+def to_entry(element, base_url: str = None):
+    """Map an RSS <item> or Atom <entry> element to a FeedParserDict"""
+    entry = feedparser.FeedParserDict()
+    atom = _split(element.tag)[0] in ATOM_NAMESPACES
+    for child in element:
+        if not isinstance(child.tag, str):
+            continue  # comments and processing instructions
+        ns, name = _split(child.tag)
+        if name == "title" and "title" not in entry:
+            entry["title"] = _text(child)
+        elif name in ("description", "summary") and ns != CONTENT_NS:
+            entry["summary"] = entry["description"] = _text(child)
+        elif (name == "encoded" and ns == CONTENT_NS) or (atom and name == "content"):
+            entry["content"] = [feedparser.FeedParserDict(value=_text(child))]
+        elif name == "link":
+            if atom:
+                if child.get("rel", "alternate") == "alternate" and "link" not in entry:
+                    entry["link"] = urljoin(base_url or "", child.get("href", ""))
+            elif "link" not in entry:
+                entry["link"] = urljoin(base_url or "", _text(child))
+        elif name == "author":
+            if atom:
+                author_name = child.find(f"{{{ns}}}name")
+                entry["author"] = _text(
+                    author_name if author_name is not None else child
+                )
+            else:
+                entry["author"] = _text(child)
+        elif name == "creator" and ns == DC_NS:
+            entry["dc_creator"] = _text(child)
+            entry.setdefault("author", entry["dc_creator"])
+        elif name in ("pubDate", "published", "issued"):
+            entry["published_parsed"] = parse_date(child.text)
+        elif name in ("updated", "modified") or (name == "date" and ns == DC_NS):
+            entry["updated_parsed"] = parse_date(child.text)
+    return entry
+
+
+def _release(element):
+    """Free a processed entry and the already processed siblings before it"""
+    element.clear()
+    parent = element.getparent()
+    while element.getprevious() is not None and parent is not None:
+        del parent[0]
+
+
+def iter_entries(fileobj, base_url: str = None, headers=None, debug: bool = False):
+    """
+    Yield feed entries from a binary file object one at a time. Falls back
+    to feedparser (on the same file) when the XML is malformed, and raises
+    FeedParseError if feedparser rejects it too.
+    """
+    yielded = 0
+    try:
+        context = etree.iterparse(
+            fileobj,
+            events=("end",),
+            tag=ENTRY_TAGS,
+            huge_tree=True,
+            resolve_entities=False,
+            no_network=True,
+        )
+        for _, element in context:
+            entry = to_entry(element, base_url)
+            yielded += 1
+            yield entry
+            _release(element)
+        root = context.root
+        if yielded or (
+            root is not None and _split(root.tag)[1] in ("rss", "RDF", "feed")
+        ):
+            return
+        log_debug(
+            debug, f"unrecognized root element {root.tag if root is not None else None}"
+        )
+    except etree.XMLSyntaxError as e:
+        log_debug(debug, f"incremental parse failed after {yielded} entries: {e}")
+
+    metrics.incr("stream_fallbacks")
+    fileobj.seek(0)
+    feed = feedparser.parse(fileobj, response_headers=headers or {})
+    if feed.bozo and not feed.entries:
+        raise FeedParseError(str(feed.bozo_exception))
+    yield from feed.entries[yielded:]
+
+
+def read_entries(response, headers=None, debug: bool = False):
+    """
+    Entries of a feed_http.FetchResult: streamed when the body is at least
+    MIN_BYTES, parsed by feedparser in one go otherwise. Raises
+    FeedParseError for a feed feedparser flags as malformed.
+    """
+    if response.size >= MIN_BYTES:
+        log_debug(debug, f"streaming {response.size} byte feed")
+        metrics.incr("streamed_feeds")
+        return iter_entries(response.stream(), response.url, headers, debug)
+    with metrics.span("feed_parse"):
+        feed = feedparser.parse(response.read(), response_headers=headers or {})
+    if feed.bozo:
+        raise FeedParseError(str(feed.bozo_exception))
+    return feed.entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream entries from a feed file")
+    parser.add_argument("file", help="RSS/Atom file")
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    t0 = time.perf_counter()
+    count = 0
+    with open(args.file, "rb") as f:
+        for entry in iter_entries(f, debug=debug):
+            count += 1
+            log_debug(debug, entry.get("title", "")[:80])
+    print(f"{count} entries in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
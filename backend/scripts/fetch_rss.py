@@ -8,16 +8,26 @@ import argparse
 import json
 import os
 import re
-import ssl
 import sys
 import time
+from collections import Counter
 from datetime import datetime
 from urllib.parse import urlparse
 
-import feedparser
+import feed_http
+import feed_snapshot
+import feed_stream
+import metrics
+import prefilter
+import theme_tagger
 from bs4 import BeautifulSoup
 from db_service import get_themes_and_tags
-from embed_text import embed_text
+from dedup import open_index
+from embed_text import MODEL_NAME, embed_vector, get_model
+from es_bulk import DEFAULT_INDEX, write_bulk
+from feed_scheduler import entry_timestamps, open_schedule
+from records import Post, posts_to_dicts
+from suggest import open_suggest, title_entries
 
 # Embeddings
 
@@ -35,9 +45,11 @@ def clean_text(text):
     if not text:
         return ""
 
-    soup = BeautifulSoup(text, "html.parser")
-    text = soup.get_text()
-    text = re.sub(r"\s+", " ", text).strip()
+    metrics.incr("html_bytes", len(text))
+    with metrics.span("html_clean"):
+        soup = BeautifulSoup(text, "html.parser")
+        text = soup.get_text()
+        text = re.sub(r"\s+", " ", text).strip()
     return text
 
 
@@ -64,86 +76,269 @@ def extract_tags_by_theme(title, description, themes: list[tuple[any, ...]]):
     return results
 
 
-def fetch_rss_feed(url, source, debug: bool = False):
+def fetch_rss_feed(
+    url,
+    source,
+    debug: bool = False,
+    dedup_index=None,
+    schedule=None,
+    filtered=None,
+):
     try:
-        themes = get_themes_and_tags()
+        with metrics.span("themes_load"):
+            themes = None
+            if feed_snapshot.replaying():
+                themes = feed_snapshot.load_themes()
+            if themes is None:
+                themes = get_themes_and_tags()
+                if feed_snapshot.recording():
+                    feed_snapshot.save_themes(themes)
+            tagger = None
+            if theme_tagger.MODE in ("embedding", "both"):
+                tagger = theme_tagger.get_tagger(
+                    themes, lambda: get_model(debug), MODEL_NAME, debug=debug
+                )
         t0 = time.time()
-        if hasattr(ssl, "_create_unverified_context"):
-            ssl._create_default_https_context = ssl._create_unverified_context
 
-        log_debug(debug, f"parsing feed: {url}")
-        feed = feedparser.parse(url)
-        if feed.bozo:
-            print(f"Error parsing RSS feed: {feed.bozo_exception}", file=sys.stderr)
+        log_debug(debug, f"fetching feed: {url}")
+        etag, last_modified = schedule.validators(url) if schedule else (None, None)
+        response = feed_http.fetch(
+            url, etag, last_modified, spool_bytes=feed_stream.SPOOL_BYTES
+        )
+        if response.not_modified:
+            log_debug(debug, "feed not modified since last poll")
+            schedule.record_poll(url, not_modified=True)
             return []
-
-        posts = []
-        for i, entry in enumerate(feed.entries):
-            title = clean_text(entry.get("title", ""))
-            description = clean_text(entry.get("description", ""))
-            link = entry.get("link", "")
-
-            author = ""
-            if hasattr(entry, "author"):
-                author = entry.author
-            elif hasattr(entry, "dc_creator"):
-                author = entry.dc_creator
-
-            published_at = None
-            if hasattr(entry, "published_parsed") and entry.published_parsed:
-                published_at = datetime(*entry.published_parsed[:6]).isoformat()
-            elif hasattr(entry, "updated_parsed") and entry.updated_parsed:
-                published_at = datetime(*entry.updated_parsed[:6]).isoformat()
-
-            content = description
-            if hasattr(entry, "content") and entry.content:
-                content = clean_text(entry.content[0].value)
-            elif hasattr(entry, "summary"):
-                content = clean_text(entry.summary)
-
-            tagsByTheme = extract_tags_by_theme(title, description, themes)
-            embedding = embed_text([title, description, content], debug)
-            nested_tags = [x["tags"] for x in tagsByTheme]
-
-            post = {
-                "title": title,
-                "description": description,
-                "content": content,
-                "author": author,
-                "url": link,
-                "publishedAt": published_at,
-                "themes": [x["theme"] for x in tagsByTheme],
-                "tags": [item for sublist in nested_tags for item in sublist],
-                "source": source,
-                "embedding": embedding,
-            }
-            posts.append(post)
-
-            if debug and i < 3:
-                log_debug(
-                    True,
-                    f"sample post[{i}] title='{title[:80]}' embedding={'yes' if embedding else 'no'}",
-                )
+        log_debug(
+            debug,
+            f"fetched {response.size} bytes in {response.elapsed_s:.2f}s, parsing",
+        )
+        headers = feed_http.parser_headers(response)
+        try:
+            posts, timestamps = process_entries(
+                feed_stream.read_entries(response, headers, debug),
+                source,
+                themes,
+                tagger,
+                debug,
+                dedup_index,
+                filtered,
+            )
+        except feed_stream.FeedParseError as e:
+            metrics.incr("feed_errors")
+            print(f"Error parsing RSS feed: {e}", file=sys.stderr)
+            if schedule:
+                schedule.record_error(url)
+            return []
+        if schedule:
+            state = schedule.record_poll(
+                url,
+                timestamps,
+                headers.get("etag"),
+                headers.get("last-modified"),
+            )
+            log_debug(
+                debug,
+                f"next poll in {state['next_due'] - state['last_poll']:.0f}s (cadence={state.get('cadence_s')})",
+            )
 
         log_debug(debug, f"parsed {len(posts)} posts in {time.time() - t0:.2f}s")
         return posts
 
     except Exception as e:
         print(f"Error fetching RSS feed: {str(e)}", file=sys.stderr)
+        if schedule:
+            schedule.record_error(url)
         return []
 
 
+def prefilter_reasons(title, description, content=None, filtered=None):
+    """
+    Prefilter reasons for an entry (see prefilter.py), counted in `filtered`
+    and the metrics. Always [] when FEED_PREFILTER is off.
+    """
+    if prefilter.MODE == "off":
+        return []
+    with metrics.span("prefilter"):
+        reasons = prefilter.check(title, description, content)
+    if reasons:
+        metrics.incr(f"prefilter_{prefilter.MODE}")
+        if filtered is not None:
+            filtered[prefilter.MODE] += 1
+            filtered.update(reasons)
+    return reasons
+
+
+def process_entries(
+    entries, source, themes, tagger, debug=False, dedup_index=None, filtered=None
+):
+    """
+    Clean, dedup, embed and tag feed entries one at a time, so a streamed
+    feed never holds more than one raw entry. Returns (posts, entry
+    timestamps for the scheduler). Entries the prefilter rejects are
+    dropped, or kept without an embedding, and counted in `filtered`.
+    """
+    posts, timestamps = [], []
+    for i, entry in enumerate(entries):
+        metrics.incr("entries")
+        timestamps.extend(entry_timestamps([entry]))
+        title = clean_text(entry.get("title", ""))
+        description = clean_text(entry.get("description", ""))
+        link = entry.get("link", "")
+
+        # Title and description alone can rule out an entry before its
+        # (much larger) body is cleaned
+        if prefilter.MODE == "drop" and prefilter_reasons(
+            title, description, filtered=filtered
+        ):
+            log_debug(debug, f"prefilter dropped {link}")
+            continue
+
+        author = ""
+        if hasattr(entry, "author"):
+            author = entry.author
+        elif hasattr(entry, "dc_creator"):
+            author = entry.dc_creator
+
+        published_at = None
+        if hasattr(entry, "published_parsed") and entry.published_parsed:
+            published_at = datetime(*entry.published_parsed[:6]).isoformat()
+        elif hasattr(entry, "updated_parsed") and entry.updated_parsed:
+            published_at = datetime(*entry.updated_parsed[:6]).isoformat()
+
+        content = description
+        if hasattr(entry, "content") and entry.content:
+            content = clean_text(entry.content[0].value)
+        elif hasattr(entry, "summary"):
+            content = clean_text(entry.summary)
+
+        quality = prefilter_reasons(title, description, content, filtered)
+        if quality and prefilter.MODE == "drop":
+            log_debug(debug, f"prefilter dropped {link}: {quality}")
+            continue
+
+        # Skip near-duplicates (cross-posts, overlapping tag feeds) before
+        # paying for tagging and embedding
+        if dedup_index is not None:
+            duplicate_of = dedup_index.check(link, f"{title} {content}")
+            if duplicate_of:
+                log_debug(
+                    debug,
+                    f"skipping near-duplicate {link} of {duplicate_of[0]} (distance={duplicate_of[1]})",
+                )
+                continue
+
+        embedding = (
+            None if quality else embed_vector([title, description, content], debug)
+        )
+        with metrics.span("tagging"):
+            tagsByTheme = []
+            if theme_tagger.MODE != "embedding":
+                tagsByTheme = extract_tags_by_theme(title, description, themes)
+            if tagger is not None:
+                literal = {x["theme"] for x in tagsByTheme}
+                tagsByTheme += [
+                    {"theme": theme, "tags": []}
+                    for theme in tagger.assign(embedding)
+                    if theme not in literal
+                ]
+        nested_tags = [x["tags"] for x in tagsByTheme]
+
+        post = Post(
+            title,
+            description,
+            content,
+            author,
+            link,
+            published_at,
+            [x["theme"] for x in tagsByTheme],
+            [item for sublist in nested_tags for item in sublist],
+            source,
+            embedding,
+            quality or None,
+        )
+        posts.append(post)
+        metrics.incr("posts")
+
+        if debug and i < 3:
+            log_debug(
+                True,
+                f"sample post[{i}] title='{title[:80]}' embedding={'yes' if embedding is not None else 'no'}",
+            )
+
+    return posts, timestamps
+
+
 def main():
     parser = argparse.ArgumentParser(description="Fetch RSS feed data")
     parser.add_argument("--url", required=True, help="RSS feed URL")
     parser.add_argument("--source", required=True, help="Source name")
+    parser.add_argument(
+        "--bulk-output",
+        help="Also write Elasticsearch _bulk NDJSON to this file ('-' for stdout instead of JSON)",
+    )
+    parser.add_argument(
+        "--index", default=DEFAULT_INDEX, help="Index name for --bulk-output"
+    )
+    parser.add_argument(
+        "--dedup-index",
+        help="Near-duplicate signature index (default: DEDUP_INDEX_PATH, off if unset)",
+    )
+    parser.add_argument(
+        "--schedule-state",
+        help="Adaptive polling state file (default: FEED_SCHEDULE_PATH, off if unset)",
+    )
+    parser.add_argument(
+        "--suggest-index",
+        help="Autocomplete index to add post titles to (default: SUGGEST_INDEX_PATH, off if unset)",
+    )
+    parser.add_argument(
+        "--prefilter",
+        choices=prefilter.MODES,
+        help="Language/quality prefilter: off, flag or drop (default: FEED_PREFILTER)",
+    )
     parser.add_argument(
         "--debug", action="store_true", help="Enable verbose debug logs to stderr"
     )
 
     args = parser.parse_args()
     debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
-    posts = fetch_rss_feed(args.url, args.source, debug)
+    if args.prefilter:
+        prefilter.MODE = args.prefilter
+    filtered = Counter()
+    posts = fetch_rss_feed(
+        args.url,
+        args.source,
+        debug,
+        open_index(args.dedup_index),
+        open_schedule(args.schedule_state),
+        filtered,
+    )
+    if filtered:
+        # stdout stays the posts array the backend parses
+        print(
+            f"[fetch_rss] prefilter: {json.dumps(dict(filtered))}",
+            file=sys.stderr,
+            flush=True,
+        )
+
+    # Write-only: the in-memory arrays are never read here
+    suggest_index = open_suggest(args.suggest_index, load=False)
+    if suggest_index is not None:
+        added = suggest_index.add(
+            title_entries(post.title for post in posts), increase=False
+        )
+        log_debug(debug, f"added {added} new titles to the suggestion index")
+
+    # Posts only become dicts (and embeddings lists) here, at the output
+    posts = posts_to_dicts(posts)
+    if args.bulk_output == "-":
+        write_bulk(posts, sys.stdout, args.index)
+        return
+    if args.bulk_output:
+        with open(args.bulk_output, "w", encoding="utf-8") as f:
+            count = write_bulk(posts, f, args.index)
+        log_debug(debug, f"wrote {count} bulk actions to {args.bulk_output}")
     print(json.dumps(posts, indent=2))
 
 
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Query Gazetteer
+spaCy-free entity lookup for query analysis: known companies, products and
+places compiled into a single regular expression, returning spans labelled
+like spaCy's ORG / PRODUCT / GPE entities
+
+Selected with QUERY_ANALYZER=gazetteer (or --analyzer gazetteer), which
+keeps semantic_search.py from importing spaCy at all. `--compare` runs both
+analyzers over the fixture queries and reports how far they agree.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+COMPANIES = [
+    "adobe",
+    "airbnb",
+    "amazon",
+    "anthropic",
+    "apple",
+    "atlassian",
+    "cloudflare",
+    "databricks",
+    "deepmind",
+    "doordash",
+    "dropbox",
+    "facebook",
+    "github",
+    "gitlab",
+    "google",
+    "hugging face",
+    "ibm",
+    "instagram",
+    "intel",
+    "linkedin",
+    "lyft",
+    "meta",
+    "microsoft",
+    "mongodb",
+    "netflix",
+    "nvidia",
+    "openai",
+    "oracle",
+    "paypal",
+    "pinterest",
+    "reddit",
+    "salesforce",
+    "shopify",
+    "slack",
+    "snowflake",
+    "spotify",
+    "stripe",
+    "tesla",
+    "tiktok",
+    "twitter",
+    "uber",
+    "vercel",
+    "whatsapp",
+    "youtube",
+    "zoom",
+]
+
+PRODUCTS = [
+    "alexa",
+    "android",
+    "chatgpt",
+    "chrome",
+    "claude",
+    "copilot",
+    "gemini",
+    "iphone",
+    "ios",
+    "llama",
+    "macos",
+    "siri",
+    "windows",
+    "xbox",
+]
+
+LOCATIONS = [
+    "africa",
+    "asia",
+    "australia",
+    "berlin",
+    "brazil",
+    "canada",
+    "china",
+    "europe",
+    "france",
+    "germany",
+    "india",
+    "italy",
+    "japan",
+    "london",
+    "new york",
+    "paris",
+    "san francisco",
+    "silicon valley",
+    "spain",
+    "tokyo",
+    "uk",
+    "united kingdom",
+    "united states",
+    "us",
+    "usa",
+]
+
+# Entries that are also ordinary words ("us", "slack", "zoom"): matched only
+# with this capitalization, so "let us" or "zoom in" are not entities
+CASE_SENSITIVE = ["US", "Meta", "Slack", "Zoom", "Windows", "Chrome"]
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[gazetteer][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def _phrase_regex(phrase: str, exact_case: bool = False) -> str:
+    body = re.escape(phrase).replace(r"\ ", r"\s+")
+    return body if exact_case else f"(?i:{body})"
+
+
+def word_pattern(phrase: str, exact_case: bool = False):
+    """
+    `phrase` as a whole word or words: "meta" matches "meta's" but not
+    "metadata". Case-insensitive unless `exact_case`.
+    """
+    return re.compile(r"(?<![\w-])" + _phrase_regex(phrase, exact_case) + r"(?![\w-])")
+
+
+class Gazetteer:
+    """
+    Whole-word, longest-match lookup of labelled phrases. Phrases listed in
+    `case_sensitive` only match with the capitalization given there.
+    """
+
+    def __init__(self, entries, case_sensitive=()):
+        # Later labels win for a phrase listed twice
+        self.labels = {phrase.lower(): label for phrase, label in entries}
+        exact = {phrase.lower(): phrase for phrase in case_sensitive}
+        # Longest first so "hugging face" wins over a shorter overlapping entry
+        phrases = sorted(self.labels, key=lambda p: (-len(p), p))
+        self.pattern = re.compile(
+            r"(?<![\w-])(?:"
+            + "|".join(_phrase_regex(exact.get(p, p), p in exact) for p in phrases)
+            + r")(?![\w-])"
+        )
+
+    def __len__(self):
+        return len(self.labels)
+
+    def entities(self, text: str):
+        """(surface text, label) for each non-overlapping match, in order"""
+        return [
+            (match.group(0), self.labels[" ".join(match.group(0).lower().split())])
+            for match in self.pattern.finditer(text)
+        ]
+
+
+def build_gazetteer(company_contexts=()):
+    """The default gazetteer, plus the companies the engine has contexts for"""
+    return Gazetteer(
+        [(place, "GPE") for place in LOCATIONS]
+        + [(product, "PRODUCT") for product in PRODUCTS]
+        + [(company, "ORG") for company in list(COMPANIES) + list(company_contexts)],
+        CASE_SENSITIVE,
+    )
+
+
+def _overlap(reference, candidate):
+    """True positives, reference size and candidate size of two sets"""
+    return len(reference & candidate), len(reference), len(candidate)
+
+
+def _f1(tp: int, ref: int, cand: int):
+    precision = tp / cand if cand else 1.0
+    recall = tp / ref if ref else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+    }
+
+
+def compare(queries, debug: bool = False):
+    """
+    Analyze `queries` with both analyzers. spaCy is the reference: entity
+    precision/recall is computed over the companies and other entities each
+    path extracts, plus how often the expanded terms and domain weights (what
+    reranking actually consumes) come out identical.
+    """
+    from semantic_search import SemanticSearchEngine, get_nlp
+
+    t0 = time.perf_counter()
+    get_nlp()
+    spacy_load_s = time.perf_counter() - t0
+
+    engines = {
+        "spacy": SemanticSearchEngine(analyzer="spacy"),
+        "gazetteer": SemanticSearchEngine(analyzer="gazetteer"),
+    }
+    timings = {name: 0.0 for name in engines}
+    totals = {"companies": [0, 0, 0], "other_entities": [0, 0, 0]}
+    same_terms = same_weights = 0
+    per_query = []
+    for query in queries:
+        analyses = {}
+        for name, engine in engines.items():
+            t0 = time.perf_counter()
+            analyses[name] = engine.expand_query_semantically(query)
+            timings[name] += time.perf_counter() - t0
+
+        reference, candidate = analyses["spacy"], analyses["gazetteer"]
+        row = {"query": query}
+        for key in totals:
+            ref = {e.lower() for e in reference["entities"][key]}
+            cand = {e.lower() for e in candidate["entities"][key]}
+            for i, value in enumerate(_overlap(ref, cand)):
+                totals[key][i] += value
+            row[key] = {"spacy": sorted(ref), "gazetteer": sorted(cand)}
+        row["same_expanded_terms"] = set(reference["expanded_terms"]) == set(
+            candidate["expanded_terms"]
+        )
+        row["same_domain_weights"] = (
+            reference["domain_weights"] == candidate["domain_weights"]
+        )
+        same_terms += row["same_expanded_terms"]
+        same_weights += row["same_domain_weights"]
+        per_query.append(row)
+        log_debug(debug, json.dumps(row))
+
+    n = max(1, len(queries))
+    return {
+        "queries": len(queries),
+        "spacy_load_ms": round(spacy_load_s * 1000, 2),
+        "analyze_ms_per_query": {
+            name: round(total * 1000 / n, 3) for name, total in timings.items()
+        },
+        "entities": {key: _f1(*counts) for key, counts in totals.items()},
+        "same_expanded_terms": round(same_terms / n, 4),
+        "same_domain_weights": round(same_weights / n, 4),
+        "per_query": per_query,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gazetteer entity lookup")
+    parser.add_argument("--text", help="Print the entities found in this text")
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Compare the gazetteer and spaCy analyzers on the fixture queries",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    if args.compare:
+        from benchmark import fixture_queries
+
+        print(json.dumps(compare(fixture_queries(), debug), indent=2))
+    elif args.text:
+        print(json.dumps(build_gazetteer().entities(args.text)))
+    else:
+        parser.error("one of --text or --compare is required")
+
+
+if __name__ == "__main__":
+    main()
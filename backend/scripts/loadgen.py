@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Search Load Generator
+Replays search queries against the Elasticsearch + semantic rerank path at a
+fixed concurrency and reports achieved QPS, latency percentiles and error
+rates per stage
+
+Queries come from the search_queries table (--from-db) or from a synthetic
+mix of the fixture queries with a popular head. Unless --es-node is given,
+Elasticsearch is replaced by a local HTTP stand-in that answers `_search`
+with canned blog-posts hits from the benchmark corpus, so the measurement
+covers the Python path without a cluster. Analysis and reranking run either
+in this process or on a running prefork_server.py (--server).
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from benchmark import fixture_queries, make_corpus, percentile
+from codec import dumps, loads
+
+DEFAULT_INDEX = "blog-posts"
+# Mirrors searchBlogPostsSemantic: searchBlogPosts(size * multiplier) keeps
+# 10 * 3 hits for reranking (it asks Elasticsearch for twice that, then slices)
+DEFAULT_CANDIDATES = 30
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[loadgen][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def tokens(text: str):
+    return set(TOKEN_RE.findall((text or "").lower()))
+
+
+class CannedIndex:
+    """Term-overlap lookup over a fixed corpus, shaped like ES search hits"""
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.postings = defaultdict(list)
+        for i, post in enumerate(corpus):
+            text = f"{post['title']} {post['description']} {' '.join(post['tags'])}"
+            for token in tokens(text):
+                self.postings[token].append(i)
+
+    def search(self, query: str, size: int):
+        counts = defaultdict(int)
+        for token in tokens(query):
+            for i in self.postings.get(token, ()):
+                counts[i] += 1
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:size]
+        hits = []
+        for i, matches in ranked:
+            post = self.corpus[i]
+            source = {k: v for k, v in post.items() if k not in ("id", "score")}
+            hits.append(
+                {"_id": post["id"], "_score": float(matches), "_source": source}
+            )
+        return {
+            "took": 0,
+            "timed_out": False,
+            "hits": {"total": {"value": len(counts)}, "hits": hits},
+        }
+
+
+def start_stand_in(
+    index: CannedIndex,
+    port: int = 0,
+    latency_ms: float = 0,
+    error_rate: float = 0,
+    seed: int = 42,
+):
+    """Serve POST /<index>/_search from `index` on a background thread"""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not self.path.rstrip("/").endswith("/_search"):
+                return self.reply(404, {"error": f"no handler for {self.path}"})
+            with lock:
+                fail = rng.random() < error_rate
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            if fail:
+                return self.reply(503, {"error": "injected failure", "status": 503})
+            request = json.loads(body or b"{}")
+            query = request.get("query", {}).get("multi_match", {}).get("query", "")
+            self.reply(200, index.search(query, int(request.get("size", 10))))
+
+        def reply(self, status: int, payload):
+            data = dumps(payload)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def query_mix(count: int, seed: int = 42):
+    """`count` fixture queries drawn with Zipf-like weights (a popular head)"""
+    queries = fixture_queries()
+    weights = [1 / (rank + 1) for rank in range(len(queries))]
+    return random.Random(seed).choices(queries, weights, k=count)
+
+
+class StageStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = []
+
+    def add(self, stage: str, seconds: float = None, error: str = None, sample=True):
+        with self.lock:
+            if error is None:
+                self.latencies[stage].append(seconds * 1000)
+                return
+            self.errors[stage] += 1
+            if sample and len(self.error_samples) < 10:
+                self.error_samples.append({"stage": stage, "error": error})
+
+    def report(self, stages):
+        summary = {}
+        for stage in stages:
+            latencies = sorted(self.latencies[stage])
+            calls = len(latencies) + self.errors[stage]
+            if not calls:
+                continue
+            summary[stage] = {
+                "calls": calls,
+                "errors": self.errors[stage],
+                "error_rate": round(self.errors[stage] / calls, 4),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p90_ms": round(percentile(latencies, 90), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+                "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+            }
+        return summary
+
+
+class EsClient:
+    """The subset of searchBlogPosts the rerank path depends on"""
+
+    def __init__(self, node: str, index: str = DEFAULT_INDEX, timeout_s: float = 10):
+        self.url = f"{node.rstrip('/')}/{index}/_search"
+        self.timeout_s = timeout_s
+        self.local = threading.local()
+
+    def search(self, query: str, size: int):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        response = session.post(
+            self.url,
+            json={"query": {"multi_match": {"query": query}}, "size": size},
+            timeout=self.timeout_s,
+        )
+        response.raise_for_status()
+        return [
+            {"id": hit["_id"], "score": hit["_score"], **hit["_source"]}
+            for hit in response.json()["hits"]["hits"]
+        ]
+
+
+class InProcessTarget:
+    """One engine shared by every load thread; its embedding cache is locked"""
+
+    stages = ("analyze", "rerank")
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def run(self, query: str, results, timed):
+        semantic_query = timed("analyze", self.engine.expand_query_semantically, query)
+        return timed(
+            "rerank", self.engine.rank_results_semantically, results, semantic_query
+        )
+
+
+class PreforkTarget:
+    """One persistent connection per load thread to prefork_server.py"""
+
+    stages = ("rank",)
+
+    def __init__(self, address: str, timeout_s: float = 30):
+        host, _, port = address.rpartition(":")
+        self.address = (host or "127.0.0.1", int(port))
+        self.timeout_s = timeout_s
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout_s)
+            conn = self.local.conn = (sock, sock.makefile("rb"))
+        return conn
+
+    def _rank(self, query: str, results):
+        sock, reader = self._connection()
+        try:
+            sock.sendall(dumps({"op": "rank", "query": query, "results": results}))
+            sock.sendall(b"\n")
+            line = reader.readline()
+        except OSError:
+            self.local.conn = None
+            raise
+        if not line:
+            self.local.conn = None
+            raise ConnectionError("server closed the connection")
+        response = loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["ranked_results"]
+
+    def run(self, query: str, results, timed):
+        return timed("rank", self._rank, query, results)
+
+
+def run_load(
+    queries,
+    es,
+    target,
+    concurrency: int,
+    candidates: int = DEFAULT_CANDIDATES,
+    duration_s: float = None,
+    debug: bool = False,
+):
+    """
+    Issue `queries` from `concurrency` closed-loop workers (each sends its
+    next query as soon as the previous one finishes) and collect per-stage
+    latencies. Stops early after `duration_s` when given.
+    """
+    stats = StageStats()
+    stages = ("es_search",) + target.stages + ("total",)
+    position = iter(range(len(queries)))
+    position_lock = threading.Lock()
+    deadline = time.perf_counter() + duration_s if duration_s else None
+
+    def timed(stage, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            value = fn(*args)
+        except Exception as e:
+            stats.add(stage, error=f"{type(e).__name__}: {e}")
+            raise
+        stats.add(stage, time.perf_counter() - t0)
+        return value
+
+    def worker():
+        while True:
+            with position_lock:
+                i = next(position, None)
+            if i is None or (deadline and time.perf_counter() >= deadline):
+                return
+            query = queries[i]
+            t0 = time.perf_counter()
+            try:
+                results = timed("es_search", es.search, query, candidates)
+                if results:
+                    target.run(query, results, timed)
+            except Exception as e:
+                # The failing stage already sampled the error
+                stats.add("total", error=str(e), sample=False)
+                log_debug(debug, f"query {i} failed: {e}")
+                continue
+            stats.add("total", time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - t0
+
+    completed = len(stats.latencies["total"])
+    return {
+        "requests": completed + stats.errors["total"],
+        "completed": completed,
+        "elapsed_s": round(elapsed, 3),
+        "achieved_qps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "stages": stats.report(stages),
+        "errors": stats.error_samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the semantic search path")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel clients")
+    parser.add_argument("--requests", type=int, default=200, help="Queries to send")
+    parser.add_argument(
+        "--duration", type=float, help="Stop after this many seconds instead"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=5, help="Unmeasured queries sent first"
+    )
+    parser.add_argument(
+        "--from-db",
+        action="store_true",
+        help="Replay the latest queries of the search_queries table",
+    )
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=DEFAULT_CANDIDATES,
+        help="Hits requested from Elasticsearch per query",
+    )
+    parser.add_argument(
+        "--es-node",
+        help="Query this Elasticsearch node instead of the local stand-in",
+    )
+    parser.add_argument("--index", default=DEFAULT_INDEX)
+    parser.add_argument(
+        "--corpus-size", type=int, default=10000, help="Stand-in corpus size"
+    )
+    parser.add_argument(
+        "--es-latency-ms",
+        type=float,
+        default=0,
+        help="Delay the stand-in adds to every response",
+    )
+    parser.add_argument(
+        "--es-error-rate",
+        type=float,
+        default=0,
+        help="Fraction of stand-in responses that fail with 503",
+    )
+    parser.add_argument(
+        "--server",
+        help="host:port of a running prefork_server.py (default: rerank in-process)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    if args.from_db:
+        from db_service import get_recent_queries
+
+        queries = get_recent_queries(args.requests)
+        if not queries:
+            parser.error("search_queries is empty")
+        # Cycle the recorded traffic when fewer queries were logged
+        queries = [queries[i % len(queries)] for i in range(args.requests)]
+    else:
+        queries = query_mix(args.requests, args.seed)
+
+    stand_in = None
+    node = args.es_node
+    if not node:
+        t0 = time.perf_counter()
+        stand_in = start_stand_in(
+            CannedIndex(make_corpus(args.corpus_size, args.seed)),
+            latency_ms=args.es_latency_ms,
+            error_rate=args.es_error_rate,
+            seed=args.seed,
+        )
+        node = f"http://127.0.0.1:{stand_in.server_port}"
+        log_debug(debug, f"stand-in on {node} ready in {time.perf_counter() - t0:.2f}s")
+    es = EsClient(node, args.index)
+
+    if args.server:
+        target = PreforkTarget(args.server)
+    else:
+        from semantic_search import SemanticSearchEngine
+
+        target = InProcessTarget(SemanticSearchEngine(debug=False))
+
+    if args.warmup:
+        run_load(queries[: args.warmup], es, target, 1, args.candidates)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "concurrency": args.concurrency,
+            "source": "search_queries" if args.from_db else "synthetic",
+            "distinct_queries": len(set(queries)),
+            "candidates": args.candidates,
+            "elasticsearch": args.es_node or "stand-in",
+            "target": args.server or "in-process",
+            "es_latency_ms": args.es_latency_ms,
+            "es_error_rate": args.es_error_rate,
+        },
+        **run_load(
+            queries,
+            es,
+            target,
+            args.concurrency,
+            args.candidates,
+            args.duration,
+            debug,
+        ),
+    }
+    if stand_in is not None:
+        stand_in.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
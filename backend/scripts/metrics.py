@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Metrics Module
+Lightweight per-stage spans and counters shared by the Python scripts
+
+Controlled by the PYTHON_METRICS environment variable:
+  - unset / "0"          : disabled, spans and counters are no-ops
+  - "stderr" / "1"       : one JSON line on stderr when the process exits
+  - "prom:<path>"        : Prometheus textfile written to <path> on exit;
+                           "{script}" in <path> is replaced by the script name
+                           and "{pid}" by the process id
+
+Forked children start with empty metrics. Processes that leave through
+os._exit (prefork workers, multiprocessing children) skip atexit and must
+call flush() themselves, or use worker_init as the pool initializer.
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.t0 = 0.0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+_sink = None
+_script = "python"
+_spans = defaultdict(lambda: [0, 0.0, 0.0])  # name -> [count, total_s, max_s]
+_counters = defaultdict(float)
+
+
+def configure(script: str, sink: str = None):
+    """
+    Enable metrics for `script`. `sink` defaults to PYTHON_METRICS.
+    Called once at import time; call again to override the script label or sink.
+    """
+    global _sink, _script
+    sink = sink if sink is not None else os.environ.get("PYTHON_METRICS", "")
+    _script = script
+    if sink in ("", "0"):
+        _sink = None
+        return
+    if _sink is None:
+        atexit.register(flush)
+    _sink = "stderr" if sink == "1" else sink
+
+
+def enabled() -> bool:
+    return _sink is not None
+
+
+def span(name: str):
+    """Time a block: `with span("encode"): ...`"""
+    if _sink is None:
+        return _NOOP_SPAN
+    return _Span(name)
+
+
+def record(name: str, seconds: float):
+    """Record one duration for span `name`"""
+    if _sink is None:
+        return
+    stats = _spans[name]
+    stats[0] += 1
+    stats[1] += seconds
+    if seconds > stats[2]:
+        stats[2] = seconds
+
+
+def incr(name: str, value: float = 1):
+    """Increment counter `name`"""
+    if _sink is None:
+        return
+    _counters[name] += value
+
+
+def snapshot():
+    """Current spans and counters as a JSON-serializable dict"""
+    return {
+        "script": _script,
+        "pid": os.getpid(),
+        "spans": {
+            name: {
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "max_ms": round(peak * 1000, 3),
+            }
+            for name, (count, total, peak) in _spans.items()
+        },
+        "counters": dict(_counters),
+    }
+
+
+def to_prometheus(data) -> str:
+    """Render a snapshot in the Prometheus text exposition format"""
+    script = data["script"]
+    spans = sorted(data["spans"].items())
+    lines = []
+    for metric, kind, value in (
+        ("blog_search_span_seconds_total", "counter", lambda s: s["total_ms"] / 1000),
+        ("blog_search_span_count_total", "counter", lambda s: s["count"]),
+        ("blog_search_span_max_seconds", "gauge", lambda s: s["max_ms"] / 1000),
+    ):
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, stats in spans:
+            lines.append(f'{metric}{{script="{script}",span="{name}"}} {value(stats)}')
+    lines.append("# TYPE blog_search_counter_total counter")
+    for name, value in sorted(data["counters"].items()):
+        lines.append(
+            f'blog_search_counter_total{{script="{script}",counter="{name}"}} {value}'
+        )
+    return "\n".join(lines) + "\n"
+
+
+def flush():
+    """Emit the collected metrics to the configured sink"""
+    if _sink is None or (not _spans and not _counters):
+        return
+    data = snapshot()
+    if _sink.startswith("prom:"):
+        path = (
+            _sink[len("prom:") :]
+            .replace("{script}", _script)
+            .replace("{pid}", str(os.getpid()))
+        )
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        # Write then rename so the node exporter never reads a partial file
+        with open(tmp_path, "w") as f:
+            f.write(to_prometheus(data))
+        os.replace(tmp_path, path)
+    else:
+        print(json.dumps({"metrics": data}), file=sys.stderr, flush=True)
+    _spans.clear()
+    _counters.clear()
+
+
+def worker_init():
+    """
+    Pool initializer: flush this worker's metrics when it exits, which
+    multiprocessing does without running atexit handlers
+    """
+    if _sink is not None:
+        from multiprocessing.util import Finalize
+
+        Finalize(None, flush, exitpriority=0)
+
+
+def _reset():
+    _spans.clear()
+    _counters.clear()
+
+
+# The parent reports what it recorded before forking; children start empty
+os.register_at_fork(after_in_child=_reset)
+
+# Pick up PYTHON_METRICS at import so spans taken during module import count too
+configure(
+    os.path.splitext(os.path.basename((getattr(sys, "argv", None) or [""])[0]))[0]
+    or "python"
+)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Local Model Registry
+One canonical on-disk copy of the embedding model, exported with safetensors
+weights and loaded offline, so cold starts never resolve the model through
+the Hugging Face hub
+
+`python model_registry.py --export` fetches the model once and saves it to
+EMBED_MODEL_DIR. Afterwards every script loads that directory with the hub in
+offline mode, and the safetensors weights are memory-mapped instead of
+unpickled. `--bench` reports import, load and first-encode times separately.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_DIR = os.environ.get(
+    "EMBED_MODEL_DIR",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "models", "all-MiniLM-L6-v2"
+    ),
+)
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[model_registry][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def is_exported(path: str = None) -> bool:
+    path = path or MODEL_DIR
+    return os.path.exists(os.path.join(path, "modules.json")) and any(
+        name.endswith(".safetensors") for _, _, files in os.walk(path) for name in files
+    )
+
+
+def _go_offline():
+    # huggingface_hub and transformers read these once, when first imported
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+
+# Done at import: embed_text imports this module, and every script imports
+# embed_text before sentence_transformers, so the flags are set in time
+if is_exported():
+    _go_offline()
+
+
+def load_model(debug: bool = False):
+    """
+    The embedding model, from the local registry when it has been exported,
+    otherwise through the hub cache as before
+    """
+    if is_exported():
+        _go_offline()
+        from sentence_transformers import SentenceTransformer
+
+        log_debug(debug, f"loading {MODEL_NAME} offline from {MODEL_DIR}")
+        return SentenceTransformer(MODEL_DIR, local_files_only=True)
+
+    from sentence_transformers import SentenceTransformer
+
+    log_debug(debug, f"{MODEL_DIR} not exported, loading {MODEL_NAME} from the hub")
+    return SentenceTransformer(MODEL_NAME)
+
+
+def export(path: str = None, debug: bool = False):
+    """Download the model once and save it with safetensors weights"""
+    path = path or MODEL_DIR
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(MODEL_NAME)
+    model.save(path, safe_serialization=True)
+    log_debug(debug, f"exported {MODEL_NAME} to {path}")
+    return path
+
+
+def bench(debug: bool = False):
+    """Cold-start timings of this process; run it in a fresh interpreter"""
+    report = {"model": MODEL_NAME, "path": MODEL_DIR, "offline": is_exported()}
+    if report["offline"]:
+        _go_offline()
+
+    t0 = time.perf_counter()
+    import sentence_transformers  # noqa: F401
+    import torch  # noqa: F401
+
+    report["import_s"] = round(time.perf_counter() - t0, 4)
+
+    t0 = time.perf_counter()
+    model = load_model(debug)
+    report["load_s"] = round(time.perf_counter() - t0, 4)
+
+    t0 = time.perf_counter()
+    model.encode("first encode after a cold start", normalize_embeddings=True)
+    report["first_encode_s"] = round(time.perf_counter() - t0, 4)
+
+    report["total_s"] = round(
+        report["import_s"] + report["load_s"] + report["first_encode_s"], 4
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local embedding model registry")
+    parser.add_argument(
+        "--export",
+        action="store_true",
+        help=f"Save {MODEL_NAME} with safetensors weights to the model directory",
+    )
+    parser.add_argument(
+        "--bench",
+        action="store_true",
+        help="Report import, load and first-encode times of a cold start",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    if args.export:
+        print(json.dumps({"exported": export(debug=debug)}))
+    elif args.bench:
+        print(json.dumps(bench(debug), indent=2))
+    else:
+        print(
+            json.dumps(
+                {"model": MODEL_NAME, "path": MODEL_DIR, "exported": is_exported()}
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
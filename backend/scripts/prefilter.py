@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Ingest Prefilter
+Cheap language and quality checks on feed entries, run by fetch_rss.py before
+an entry is embedded, so non-English, near-empty and boilerplate entries do
+not cost an encode or pollute the English MiniLM index
+
+Checks use only the text itself and a few word lists, no model:
+  - character classes: share of letters outside the Latin alphabet, share
+    of letters among non-space characters
+  - function words: English vs other languages' most frequent words
+  - length: too few words once title-only echoes are discounted
+  - boilerplate: "appeared first on", "continue reading", paywall teasers...
+
+FEED_PREFILTER selects "off" (default), "flag" (keep the post, skip its
+embedding and list the reasons in `quality`) or "drop".
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+MODE = os.environ.get("FEED_PREFILTER", "off")
+MODES = ("off", "flag", "drop")
+MIN_WORDS = int(os.environ.get("FEED_PREFILTER_MIN_WORDS", "15"))
+# Fewer words than this are not enough to call the language
+LANGUAGE_MIN_WORDS = 12
+# Long bodies are judged on their start and end (where teasers and footers
+# sit), which keeps the check cost independent of the post size
+SAMPLE_HEAD = 2000
+SAMPLE_TAIL = 1000
+MAX_NON_LATIN = 0.3
+MIN_LETTER_RATIO = 0.5
+
+FUNCTION_WORDS = {
+    "en": set(
+        "the of and to in is that for it with as was on be by this are or from "
+        "at an but not have has you your we our they their can will what how "
+        "which more about when if all there one been would into its also new "
+        "use using these than just like".split()
+    ),
+    "fr": set(
+        "le la les des du un une et est en que qui dans pour pas sur au avec "
+        "ce cette sont par plus nous vous ou mais aux ont".split()
+    ),
+    "es": set(
+        "el la los las del un una y es en que por para con se su al lo como "
+        "más pero sus este esta son muy también".split()
+    ),
+    "de": set(
+        "der die das und ist nicht ein eine zu den von mit sich des auf für "
+        "im dem auch es als an wie wir sie bei oder".split()
+    ),
+    "it": set(
+        "il lo la gli le di che è e un una per non con del della sono si come "
+        "anche nel alla più ma questo".split()
+    ),
+    "pt": set(
+        "o os as do da dos das um uma e é em que para com não se na no por "
+        "mais como mas ao seu sua".split()
+    ),
+    "nl": set(
+        "de het een en van is dat op te in zijn voor met niet aan er ook als "
+        "bij maar om dan wordt".split()
+    ),
+    "id": set(
+        "yang dan di ini itu dengan untuk dari dalam tidak akan pada juga ke "
+        "ada adalah karena oleh sudah bisa kami".split()
+    ),
+}
+
+BOILERPLATE_RE = re.compile(
+    r"the post .{0,200}? appeared first on .{0,100}?(?:\.|$)"
+    r"|continue reading(?: on [\w .-]+)?(?: »| →|\.\.\.)?"
+    r"|read (?:the )?(?:full|more)(?: article| story| post)?(?: here| on [\w .-]+)?"
+    r"|click here(?: to [\w ]+)?"
+    r"|subscribe (?:to|for) (?:our|the) newsletter"
+    r"|(?:this|the rest of this) (?:content|post|article|story) is (?:for|only available to) "
+    r"(?:paid |premium )?(?:members|subscribers)(?: only)?"
+    r"|sign up (?:now )?to (?:read|continue)"
+    r"|\[(?:…|\.\.\.)\]",
+    re.IGNORECASE,
+)
+PAYWALL_RE = re.compile(
+    r"(?:members?|subscribers)[- ]only|for (?:paid |premium )?(?:members|subscribers)"
+    r"|sign up (?:now )?to (?:read|continue)",
+    re.IGNORECASE,
+)
+# A paywall phrase this close to the end is a teaser's call to action rather
+# than a sentence about subscriptions
+PAYWALL_TAIL = 300
+WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[prefilter][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def character_reasons(text: str):
+    """Script and symbol-density checks from one pass over the characters"""
+    letters = latin = visible = 0
+    for char in text:
+        if char.isspace():
+            continue
+        visible += 1
+        if char.isalpha():
+            letters += 1
+            # Basic Latin and Latin-1/Extended-A/B letters
+            if char < "ɐ":
+                latin += 1
+    if not visible:
+        return []
+    reasons = []
+    if letters and (letters - latin) / letters > MAX_NON_LATIN:
+        reasons.append("non_latin")
+    elif letters / visible < MIN_LETTER_RATIO:
+        reasons.append("low_text")
+    return reasons
+
+
+def guess_language(words):
+    """Language whose function words cover the most of `words`, and its share"""
+    counts = {lang: 0 for lang in FUNCTION_WORDS}
+    for word in words:
+        for lang, vocabulary in FUNCTION_WORDS.items():
+            if word in vocabulary:
+                counts[lang] += 1
+    best = max(counts, key=lambda lang: (counts[lang], lang == "en"))
+    return best, counts[best] / max(1, len(words)), counts["en"] / max(1, len(words))
+
+
+def language_reasons(text: str):
+    """Script, symbol-density and language reasons for `text`"""
+    reasons = character_reasons(text)
+    if reasons:
+        return reasons
+    words = [word.lower() for word in WORD_RE.findall(text)]
+    if len(words) < LANGUAGE_MIN_WORDS:
+        return []
+    lang, share, english = guess_language(words)
+    # Shared words ("a", "in", "de") keep English ahead unless clearly outscored
+    if lang != "en" and share >= 0.1 and share > 1.5 * english:
+        return ["non_english"]
+    return []
+
+
+def content_reasons(title: str, content: str):
+    """
+    Boilerplate and minimum-length reasons for the cleaned body. A paywall
+    phrase only marks boilerplate when it ends the body or little is left
+    around it, so posts that merely mention "premium subscribers" pass.
+    """
+    reasons = []
+    if PAYWALL_RE.search(content[-PAYWALL_TAIL:]):
+        reasons.append("boilerplate")
+    stripped = BOILERPLATE_RE.sub(" ", content)
+    # A body that only repeats the title adds nothing to embed
+    if stripped.strip().lower().startswith(title.strip().lower()):
+        stripped = stripped.strip()[len(title.strip()) :]
+    words = len(WORD_RE.findall(stripped))
+    if words < MIN_WORDS:
+        if "boilerplate" in reasons:
+            reasons.append("too_short")
+        elif PAYWALL_RE.search(content) or len(WORD_RE.findall(content)) >= MIN_WORDS:
+            reasons.append("boilerplate")
+        else:
+            reasons.append("too_short")
+    return reasons
+
+
+def sample(text: str) -> str:
+    if len(text) <= SAMPLE_HEAD + SAMPLE_TAIL:
+        return text
+    return f"{text[:SAMPLE_HEAD]} {text[-SAMPLE_TAIL:]}"
+
+
+def check(title: str, description: str, content: str = None):
+    """
+    Reasons to keep an entry out of the index, [] when it looks fine. With
+    `content` None, only the title and description are checked, so an entry
+    can be dropped before its HTML body is cleaned.
+    """
+    reasons = language_reasons(sample(f"{title} {description}"))
+    if content is not None and not reasons:
+        content = sample(content)
+        reasons = language_reasons(content) + content_reasons(title, content)
+    return sorted(set(reasons))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check entry text quality")
+    parser.add_argument("--title", default="", help="Entry title")
+    parser.add_argument("--text", required=True, help="Entry description/content")
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    words = [word.lower() for word in WORD_RE.findall(args.text)]
+    log_debug(debug, f"language guess: {guess_language(words)}")
+    print(json.dumps({"reasons": check(args.title, "", args.text)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Pre-fork Worker Server
+Loads the embedding model and spaCy once, then forks workers that share the
+weights copy-on-write and serve embedding / semantic search requests
+
+Protocol: one JSON request per line on a TCP connection, one JSON response
+per line back.
+  {"op": "embed", "text": "..."}                      -> {"embedding": [...]}
+  {"op": "analyze", "query": "...", "embeddings": true} -> {"semantic_analysis": {...}}
+  {"op": "rank", "query": "...", "results": [...]}      -> {"semantic_analysis": {...}, "ranked_results": [...]}
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from collections import deque
+
+import metrics
+from codec import dumps, loads
+
+# Workers dying sooner than this after being forked are respawned with an
+# exponentially growing delay, up to MAX_RESPAWN_DELAY_S
+MIN_UPTIME_S = 5.0
+MAX_RESPAWN_DELAY_S = 30.0
+# More respawns than this within RESTART_WINDOW_S and the server gives up
+RESTART_BUDGET = int(os.environ.get("PREFORK_RESTART_BUDGET", "10"))
+RESTART_WINDOW_S = 60.0
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print(
+            f"[prefork_server][{os.getpid()}][DEBUG]",
+            *args,
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def handle_request(engine, request):
+    from embed_text import embed_query
+
+    op = request.get("op")
+    if op == "embed":
+        return {"embedding": embed_query(request["text"])}
+
+    semantic_query = engine.expand_query_semantically(request["query"])
+    embeddings = (
+        engine.embed_queries(semantic_query) if request.get("embeddings") else {}
+    )
+    if op == "analyze":
+        return {"semantic_analysis": semantic_query, **embeddings}
+    if op == "rank":
+        ranked_results = engine.rank_results_semantically(
+            request.get("results", []), semantic_query
+        )
+        return {
+            "semantic_analysis": semantic_query,
+            "ranked_results": ranked_results[:25],
+            **embeddings,
+        }
+    raise ValueError(f"unknown op: {op}")
+
+
+def serve_connection(engine, conn, debug: bool = False):
+    with conn, conn.makefile("rb") as reader, conn.makefile("wb") as writer:
+        for line in reader:
+            if not line.strip():
+                continue
+            try:
+                response = handle_request(engine, loads(line))
+            except Exception as e:
+                log_debug(debug, f"request failed: {str(e)}")
+                response = {"error": str(e)}
+            writer.write(dumps(response) + b"\n")
+            writer.flush()
+
+
+def worker_loop(listener, engine, threads: int, debug: bool = False):
+    import torch
+
+    # Each worker gets its own slice of the cores instead of every worker
+    # spinning up one intra-op thread per core
+    torch.set_num_threads(threads)
+    # Exit through spawn_worker's finally, so metrics are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, lambda signum, frame: sys.exit(0))
+    log_debug(debug, f"worker ready with {threads} torch threads")
+    while True:
+        # All workers block in accept() on the shared socket; the kernel
+        # hands each new connection to exactly one of them
+        conn, _ = listener.accept()
+        serve_connection(engine, conn, debug)
+
+
+def spawn_worker(listener, engine, threads: int, debug: bool = False) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            worker_loop(listener, engine, threads, debug)
+        except Exception as e:
+            print(f"Worker crashed: {str(e)}", file=sys.stderr)
+            code = 1
+        finally:
+            # os._exit skips atexit, where metrics would normally be written
+            try:
+                metrics.flush()
+            finally:
+                os._exit(code)
+    return pid
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Pre-fork semantic search server")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host")
+    parser.add_argument("--port", type=int, default=8766, help="TCP port")
+    parser.add_argument(
+        "--workers", type=int, default=cpu_count, help="Number of forked workers"
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        help="Torch intra-op threads per worker (default: cores / workers)",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+    threads = args.threads_per_worker or max(1, cpu_count // max(1, args.workers))
+
+    # Must be set before torch is imported so OpenMP/MKL pools start small
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(threads))
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    t0 = time.time()
+    # The engine loads spaCy (unless QUERY_ANALYZER=gazetteer) and reuses
+    # embed_text's model
+    from embed_text import get_model
+    from semantic_search import SemanticSearchEngine
+
+    engine = SemanticSearchEngine(debug=debug, model=get_model(debug))
+    log_debug(debug, f"models loaded in {time.time() - t0:.2f}s")
+
+    # Move everything allocated so far out of the GC's reach so collections in
+    # the workers don't touch (and un-share) the model's pages
+    gc.collect()
+    gc.freeze()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(128)
+
+    # pid -> fork time
+    workers = {
+        spawn_worker(listener, engine, threads, debug): time.monotonic()
+        for _ in range(args.workers)
+    }
+    log_debug(
+        debug, f"listening on {args.host}:{args.port} with {len(workers)} workers"
+    )
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Supervise: replace workers that die until asked to stop, backing off
+    # when they crash on start and giving up when they keep crashing
+    restarts = deque()
+    delay_s = 0.0
+    exit_code = 0
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+
+        now = time.monotonic()
+        restarts.append(now)
+        while now - restarts[0] > RESTART_WINDOW_S:
+            restarts.popleft()
+        if len(restarts) > RESTART_BUDGET:
+            print(
+                f"{len(restarts)} worker restarts in {RESTART_WINDOW_S:.0f}s, "
+                "shutting down",
+                file=sys.stderr,
+            )
+            exit_code = 1
+            stop(None, None)
+            continue
+
+        if now - started < MIN_UPTIME_S:
+            delay_s = min(MAX_RESPAWN_DELAY_S, max(0.5, delay_s * 2))
+        else:
+            delay_s = 0.0
+        log_debug(
+            debug, f"worker {pid} exited ({status}), respawning in {delay_s:.1f}s"
+        )
+        # Short sleeps so a stop signal during the backoff is acted on quickly
+        resume = now + delay_s
+        while not stopping and time.monotonic() < resume:
+            time.sleep(max(0.0, min(0.1, resume - time.monotonic())))
+        if not stopping:
+            workers[spawn_worker(listener, engine, threads, debug)] = time.monotonic()
+
+    listener.close()
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
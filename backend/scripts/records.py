@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Compact Records
+Slotted post records with NumPy embeddings for ingest, and a columnar batch
+of rerank candidates. Both are converted to the plain JSON shape only at the
+output boundary.
+"""
+
+import numpy as np
+
+
+class Post:
+    """One fetched post; `embedding` is a float32 vector or None"""
+
+    __slots__ = (
+        "title",
+        "description",
+        "content",
+        "author",
+        "url",
+        "published_at",
+        "themes",
+        "tags",
+        "source",
+        "embedding",
+        "quality",
+    )
+
+    def __init__(
+        self,
+        title,
+        description,
+        content,
+        author,
+        url,
+        published_at,
+        themes,
+        tags,
+        source,
+        embedding=None,
+        quality=None,
+    ):
+        self.title = title
+        self.description = description
+        self.content = content
+        self.author = author
+        self.url = url
+        self.published_at = published_at
+        self.themes = themes
+        self.tags = tags
+        self.source = source
+        self.embedding = embedding
+        # Prefilter reasons for a flagged, unembedded post
+        self.quality = quality
+
+    def to_dict(self):
+        """The post as fetch_rss.py has always emitted it"""
+        post = {
+            "title": self.title,
+            "description": self.description,
+            "content": self.content,
+            "author": self.author,
+            "url": self.url,
+            "publishedAt": self.published_at,
+            "themes": self.themes,
+            "tags": self.tags,
+            "source": self.source,
+            "embedding": (
+                self.embedding.tolist() if self.embedding is not None else None
+            ),
+        }
+        if self.quality:
+            post["quality"] = self.quality
+        return post
+
+
+def posts_to_dicts(posts):
+    return [post.to_dict() for post in posts]
+
+
+def candidate_text(result) -> str:
+    """Text of an Elasticsearch hit that reranking scores against"""
+    return f"{result.get('title', '')} {result.get('description', '')} {' '.join(result.get('tags', []))} {' '.join(result.get('themes', []))}"
+
+
+def pre_scores(domain, company, expanded, original):
+    """Lexical/domain score used to pick which candidates get encoded"""
+    return (
+        (np.minimum(domain / 10, 1.0) * 0.3)
+        + (np.minimum(company / 10, 1.0) * 0.1)
+        + (np.minimum(expanded / 10, 1.0) * 0.1)
+        + original * 0.5
+    )
+
+
+class CandidateBatch:
+    """
+    Rerank candidates as columns: the untouched hits, their texts and one
+    float64 array per score. Hits are only decorated with the scores, in
+    ranked order, by `to_results`.
+    """
+
+    __slots__ = (
+        "results",
+        "texts",
+        "original",
+        "domain",
+        "company",
+        "expanded",
+        "semantic",
+        "encoded",
+        "score",
+    )
+
+    def __init__(self, results):
+        n = len(results)
+        self.results = results
+        self.texts = [candidate_text(r) for r in results]
+        self.original = np.fromiter(
+            (r.get("score", 0) for r in results), dtype=np.float64, count=n
+        )
+        self.domain = np.zeros(n)
+        self.company = np.zeros(n)
+        self.expanded = np.zeros(n)
+        self.semantic = np.zeros(n)
+        self.encoded = np.zeros(n, dtype=bool)
+        self.score = np.zeros(n)
+
+    def __len__(self):
+        return len(self.results)
+
+    def pre_scores(self):
+        return pre_scores(self.domain, self.company, self.expanded, self.original)
+
+    def combine(self):
+        """Final score: semantic similarity plus the lexical/domain terms"""
+        self.score = (
+            self.semantic * 0.6
+            + (np.minimum(self.domain / 10, 1.0) * 0.3)
+            + (np.minimum(self.company / 10, 1.0) * 0.1)
+            + (np.minimum(self.expanded / 10, 1.0) * 0.1)
+            + self.original * 0.5
+        )
+        return self.score
+
+    def ranking(self):
+        """Indices by descending score, encoded candidates first, ties stable"""
+        return np.lexsort((-self.score, ~self.encoded))
+
+    def to_results(self, order=None):
+        """The hits in `order`, decorated with their score columns"""
+        order = range(len(self)) if order is None else order
+        ranked = []
+        for i in order:
+            result = self.results[i]
+            result["domain_score"] = float(self.domain[i])
+            result["company_bonus"] = float(self.company[i])
+            result["expanded_bonus"] = float(self.expanded[i])
+            result["original_score"] = float(self.original[i])
+            result["semantic_score"] = float(self.score[i])
+            result["score"] = float(self.score[i])
+            ranked.append(result)
+        return ranked
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Corpus Re-embedding
+Recomputes the embedding of every stored blog post with the current model and
+text recipe, without re-fetching any feed
+
+Posts are streamed from Postgres in id order with a server-side cursor,
+embedded in large batches and written as Elasticsearch bulk actions tagged
+with the embedding version. Progress is checkpointed after every batch, so an
+interrupted run resumes after the last written post; a checkpoint made with a
+different embedding version is ignored and the job starts over.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+
+from db_service import count_blog_posts, get_connection, iter_blog_post_batches
+from embed_text import EMBEDDING_VERSION, embed_many
+from es_bulk import DEFAULT_INDEX, SOURCE_FIELDS, BulkLoader, to_bulk_lines
+
+BATCH_SIZE = int(os.environ.get("REEMBED_BATCH_SIZE", "256"))
+CHECKPOINT_PATH = os.environ.get("REEMBED_CHECKPOINT_PATH", "reembed_checkpoint.json")
+FIELDS = SOURCE_FIELDS + ["embeddingModel"]
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[reembed][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def log_progress(*args):
+    print("[reembed]", *args, file=sys.stderr, flush=True)
+
+
+def new_checkpoint(version: str):
+    return {
+        "version": version,
+        "last_id": "",
+        "processed": 0,
+        "started_at": datetime.now().isoformat(),
+        "done": False,
+    }
+
+
+def load_checkpoint(path: str, version: str, restart: bool = False, debug=False):
+    """The saved checkpoint for `version`, or a fresh one"""
+    if restart or not os.path.exists(path):
+        return new_checkpoint(version)
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("version") != version:
+        log_debug(
+            debug,
+            f"checkpoint is for {checkpoint.get('version')}, starting over for {version}",
+        )
+        return new_checkpoint(version)
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def to_document(row, embedding, version: str):
+    """A blog_posts row as an Elasticsearch source with its new embedding"""
+    doc = {
+        key: value.isoformat() if isinstance(value, (date, datetime)) else value
+        for key, value in row.items()
+    }
+    doc["embedding"] = embedding.tolist() if embedding is not None else None
+    doc["embeddingModel"] = version
+    return doc
+
+
+def format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def reembed(
+    conn,
+    write,
+    checkpoint_path: str = CHECKPOINT_PATH,
+    version: str = EMBEDDING_VERSION,
+    index: str = DEFAULT_INDEX,
+    batch_size: int = BATCH_SIZE,
+    restart: bool = False,
+    limit: int = None,
+    debug: bool = False,
+):
+    """
+    Re-embed the posts after the checkpoint, handing each batch's bulk
+    (action, source) pairs to `write` before the checkpoint moves past it
+    """
+    checkpoint = load_checkpoint(checkpoint_path, version, restart, debug)
+    if checkpoint["done"]:
+        log_progress(f"already complete for {version}")
+        return checkpoint
+
+    remaining = count_blog_posts(conn, checkpoint["last_id"])
+    if limit is not None:
+        remaining = min(remaining, limit)
+    log_progress(
+        f"{remaining} posts to embed with {version}"
+        + (f", resuming after {checkpoint['last_id']}" if checkpoint["last_id"] else "")
+    )
+
+    t0 = time.perf_counter()
+    session_done = 0
+    for rows in iter_blog_post_batches(conn, checkpoint["last_id"], batch_size):
+        if limit is not None:
+            if session_done >= limit:
+                break
+            rows = rows[: limit - session_done]
+        vectors = embed_many(
+            [[row["title"], row["description"], row["content"]] for row in rows], debug
+        )
+        docs = [to_document(row, vector, version) for row, vector in zip(rows, vectors)]
+        write(list(to_bulk_lines(docs, index, FIELDS, id_field="id")))
+
+        session_done += len(rows)
+        checkpoint["last_id"] = rows[-1]["id"]
+        checkpoint["processed"] += len(rows)
+        save_checkpoint(checkpoint_path, checkpoint)
+
+        elapsed = time.perf_counter() - t0
+        rate = session_done / elapsed if elapsed else 0.0
+        eta = (remaining - session_done) / rate if rate else 0.0
+        log_progress(
+            f"{session_done}/{remaining} posts, {rate:.1f} posts/s, ETA {format_eta(eta)}"
+        )
+    else:
+        checkpoint["done"] = True
+        checkpoint["finished_at"] = datetime.now().isoformat()
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    elapsed = time.perf_counter() - t0
+    checkpoint["session"] = {
+        "posts": session_done,
+        "seconds": round(elapsed, 2),
+        "posts_per_s": round(session_done / elapsed, 1) if elapsed else 0.0,
+    }
+    return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-embed every stored blog post with the current model"
+    )
+    parser.add_argument(
+        "--output",
+        help="Append bulk NDJSON to this file instead of sending it to Elasticsearch",
+    )
+    parser.add_argument(
+        "--node",
+        default=os.environ.get("ELASTICSEARCH_NODE", "http://localhost:9200"),
+        help="Elasticsearch node URL",
+    )
+    parser.add_argument("--username", default=os.environ.get("ELASTICSEARCH_USERNAME"))
+    parser.add_argument("--password", default=os.environ.get("ELASTICSEARCH_PASSWORD"))
+    parser.add_argument("--index", default=DEFAULT_INDEX)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the checkpoint and re-embed the whole corpus",
+    )
+    parser.add_argument(
+        "--limit", type=int, help="Stop after this many posts (resumable)"
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    bulk = {"requests": 0, "sent": 0, "failed": 0, "retries": 0, "errors": []}
+    if args.output:
+        out = open(args.output, "a", encoding="utf-8")
+
+        def write(pairs):
+            for action, source in pairs:
+                out.write(action + "\n")
+                out.write(source + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            bulk["sent"] += len(pairs)
+
+    else:
+        out = None
+        loader = BulkLoader(args.node, args.username, args.password, debug=debug)
+
+        def write(pairs):
+            summary = loader.load(pairs)
+            for key in ("requests", "sent", "failed", "retries"):
+                bulk[key] += summary[key]
+            bulk["errors"] = (bulk["errors"] + summary["errors"])[:10]
+            if summary["failed"]:
+                # Keep the checkpoint before this batch so a rerun retries it
+                raise RuntimeError(f"{summary['failed']} bulk items failed")
+
+    conn = get_connection()
+    try:
+        checkpoint = reembed(
+            conn,
+            write,
+            args.checkpoint,
+            index=args.index,
+            batch_size=args.batch_size,
+            restart=args.restart,
+            limit=args.limit,
+            debug=debug,
+        )
+    except RuntimeError as e:
+        print(json.dumps({"error": str(e), "bulk": bulk}, indent=2))
+        sys.exit(1)
+    finally:
+        conn.close()
+        if out is not None:
+            out.close()
+
+    print(json.dumps({**checkpoint, "bulk": bulk}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
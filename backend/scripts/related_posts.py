@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Related Posts
+Precomputed "more like this" table: the k nearest neighbours of every post by
+embedding cosine similarity, so related posts are a key lookup at view time
+
+Similarities are computed in square blocks of BLOCK_SIZE x BLOCK_SIZE, each
+block keeping only its top-k per row through `argpartition` before being
+merged into the running top-k, so memory is bounded by the block size and k
+rather than the corpus size. Vectors and neighbour lists are kept in SQLite.
+Later runs only score the new posts: they get their own neighbours,
+and existing posts' lists are merged with the new candidates. A changed or
+deleted post, or a different k, triggers a full rebuild.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import requests
+
+K = int(os.environ.get("RELATED_K", "10"))
+BLOCK_SIZE = int(os.environ.get("RELATED_BLOCK_SIZE", "1024"))
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[related_posts][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def merge_top_k(indices, scores, more_indices, more_scores, k: int):
+    """Row-wise top-k of two (rows, *) candidate sets, best first"""
+    indices = np.concatenate([indices, more_indices], axis=1)
+    scores = np.concatenate([scores, more_scores], axis=1)
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        indices = np.take_along_axis(indices, keep, axis=1)
+        scores = np.take_along_axis(scores, keep, axis=1)
+    # Descending score, ties by position for a stable order
+    order = np.lexsort((indices, -scores), axis=1)
+    return np.take_along_axis(indices, order, 1), np.take_along_axis(scores, order, 1)
+
+
+def top_k_blocked(
+    queries, corpus, k: int, block_size: int = BLOCK_SIZE, self_offset: int = None
+):
+    """
+    Indices into `corpus` and cosine scores of the k nearest rows for each
+    row of `queries` (both unit-normalized). With `self_offset`, queries[i]
+    is corpus[self_offset + i] and is never its own neighbour. Rows with
+    fewer than k candidates are padded with index -1 and score -inf.
+    """
+    m, n = len(queries), len(corpus)
+    indices = np.full((m, k), -1, dtype=np.int64)
+    scores = np.full((m, k), -np.inf, dtype=np.float32)
+    for start in range(0, m, block_size):
+        stop = min(start + block_size, m)
+        best_i, best_s = indices[start:stop, :0], scores[start:stop, :0]
+        for col in range(0, n, block_size):
+            col_stop = min(col + block_size, n)
+            sims = queries[start:stop] @ corpus[col:col_stop].T
+            if self_offset is not None:
+                own = np.arange(start, stop) + self_offset
+                inside = (own >= col) & (own < col_stop)
+                sims[np.nonzero(inside)[0], own[inside] - col] = -np.inf
+            cols = np.broadcast_to(np.arange(col, col_stop), sims.shape)
+            best_i, best_s = merge_top_k(best_i, best_s, cols, sims, k)
+        width = best_i.shape[1]
+        indices[start:stop, :width] = best_i
+        scores[start:stop, :width] = best_s
+    # With k or fewer candidates the excluded self slot (-inf) stays in the
+    # top-k; mark it as padding like any other missing neighbour
+    indices[~np.isfinite(scores)] = -1
+    scores[indices < 0] = -np.inf
+    return indices, scores
+
+
+class RelatedIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS posts ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, embedding BLOB NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS related ("
+            "id TEXT PRIMARY KEY, neighbors TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+
+    def lookup(self, post_id: str, limit: int = None):
+        """[[post id, score], ...] most similar first, or [] when unknown"""
+        row = self._db.execute(
+            "SELECT neighbors FROM related WHERE id = ?", (post_id,)
+        ).fetchone()
+        neighbors = json.loads(row[0]) if row else []
+        return neighbors[:limit] if limit else neighbors
+
+    def _stored_k(self):
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'k'").fetchone()
+        return int(row[0]) if row else None
+
+    def _load(self):
+        ids, blobs = [], []
+        for post_id, blob in self._db.execute(
+            "SELECT id, embedding FROM posts ORDER BY row"
+        ):
+            ids.append(post_id)
+            blobs.append(blob)
+        if not ids:
+            return ids, None
+        vectors = np.frombuffer(b"".join(blobs), dtype=np.float32)
+        return ids, vectors.reshape(len(ids), -1)
+
+    def _load_neighbors(self, ids, k: int):
+        position = {post_id: i for i, post_id in enumerate(ids)}
+        indices = np.full((len(ids), k), -1, dtype=np.int64)
+        scores = np.full((len(ids), k), -np.inf, dtype=np.float32)
+        for post_id, neighbors in self._db.execute("SELECT id, neighbors FROM related"):
+            i = position[post_id]
+            for j, (other, score) in enumerate(json.loads(neighbors)[:k]):
+                indices[i, j] = position[other]
+                scores[i, j] = score
+        return indices, scores
+
+    def _write_neighbors(self, ids, rows, indices, scores):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO related (id, neighbors) VALUES (?, ?)",
+            (
+                (
+                    ids[i],
+                    json.dumps(
+                        [
+                            [ids[j], round(float(s), 5)]
+                            for j, s in zip(indices[i], scores[i])
+                            if j >= 0 and np.isfinite(s)
+                        ],
+                        separators=(",", ":"),
+                    ),
+                )
+                for i in rows
+            ),
+        )
+
+    def _insert_posts(self, ids, vectors, first_row: int):
+        self._db.executemany(
+            "INSERT INTO posts (row, id, embedding) VALUES (?, ?, ?)",
+            (
+                (first_row + i, post_id, vectors[i].tobytes())
+                for i, post_id in enumerate(ids)
+            ),
+        )
+
+    def rebuild(self, ids, vectors, k: int = K, block_size: int = BLOCK_SIZE):
+        indices, scores = top_k_blocked(vectors, vectors, k, block_size, 0)
+        self._db.execute("BEGIN")
+        try:
+            self._db.execute("DELETE FROM posts")
+            self._db.execute("DELETE FROM related")
+            self._insert_posts(ids, vectors, 0)
+            self._write_neighbors(ids, range(len(ids)), indices, scores)
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('k', ?)", (str(k),))
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        return len(ids)
+
+    def sync(
+        self,
+        ids,
+        vectors,
+        k: int = K,
+        block_size: int = BLOCK_SIZE,
+        force_rebuild: bool = False,
+        debug: bool = False,
+    ):
+        """
+        Bring the table in line with the full current corpus (`ids` and their
+        embeddings), incrementally when posts were only added
+        """
+        t0 = time.perf_counter()
+        vectors = normalize_rows(vectors)
+        stored_ids, stored = self._load()
+        position = {post_id: i for i, post_id in enumerate(stored_ids)}
+        current = {post_id: i for i, post_id in enumerate(ids)}
+        removed = [post_id for post_id in stored_ids if post_id not in current]
+        changed = [
+            post_id
+            for post_id in stored_ids
+            if post_id in current
+            and not np.array_equal(stored[position[post_id]], vectors[current[post_id]])
+        ]
+        added = [i for i, post_id in enumerate(ids) if post_id not in position]
+        summary = {
+            "posts": len(ids),
+            "added": len(added),
+            "changed": len(changed),
+            "removed": len(removed),
+        }
+
+        if (
+            force_rebuild
+            or removed
+            or changed
+            or self._stored_k() != k
+            or stored is None
+            or stored.shape[1] != vectors.shape[1]
+        ):
+            log_debug(debug, f"full rebuild: {summary}")
+            summary["mode"] = "rebuild"
+            summary["rows_updated"] = self.rebuild(ids, vectors, k, block_size)
+        elif not added:
+            summary["mode"] = "unchanged"
+            summary["rows_updated"] = 0
+        else:
+            summary["mode"] = "incremental"
+            summary["rows_updated"] = self._add(
+                stored_ids,
+                stored,
+                [ids[i] for i in added],
+                vectors[added],
+                k,
+                block_size,
+            )
+        summary["seconds"] = round(time.perf_counter() - t0, 3)
+        return summary
+
+    def _add(self, stored_ids, stored, new_ids, new_vectors, k, block_size):
+        """Neighbours for new posts, and new candidates for the existing ones"""
+        n = len(stored_ids)
+        all_ids = stored_ids + new_ids
+        corpus = np.concatenate([stored, new_vectors])
+        new_i, new_s = top_k_blocked(new_vectors, corpus, k, block_size, n)
+
+        old_i, old_s = self._load_neighbors(stored_ids, k)
+        cand_i, cand_s = top_k_blocked(stored, new_vectors, k, block_size)
+        cand_i = np.where(cand_i >= 0, cand_i + n, -1)
+        merged_i, merged_s = merge_top_k(old_i, old_s, cand_i, cand_s, k)
+        # Padding (-1) candidates from short lists carry -inf and never win
+        merged_i[np.isneginf(merged_s)] = -1
+        changed_rows = np.nonzero((merged_i != old_i).any(axis=1))[0]
+
+        indices = np.concatenate([merged_i, new_i])
+        scores = np.concatenate([merged_s, new_s])
+        self._db.execute("BEGIN")
+        try:
+            self._insert_posts(new_ids, new_vectors, n)
+            self._write_neighbors(
+                all_ids,
+                list(changed_rows) + list(range(n, len(all_ids))),
+                indices,
+                scores,
+            )
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        return len(changed_rows) + len(new_ids)
+
+
+def open_related(path: str = None):
+    """RelatedIndex at `path` or RELATED_POSTS_PATH, or None when unset"""
+    path = path or os.environ.get("RELATED_POSTS_PATH")
+    if not path:
+        return None
+    return RelatedIndex(path)
+
+
+def iter_bulk_embeddings(lines):
+    """(document id, embedding) from a bulk NDJSON body, e.g. reembed.py --output"""
+    from es_bulk import read_pairs
+
+    for action, source in read_pairs(lines):
+        meta = next(iter(json.loads(action).values()))
+        embedding = json.loads(source).get("embedding")
+        if embedding:
+            yield meta["_id"], embedding
+
+
+def iter_es_embeddings(
+    node: str,
+    index: str,
+    username: str = None,
+    password: str = None,
+    batch_size: int = 1000,
+):
+    """(document id, embedding) for every document of `index`, via the scroll API"""
+    session = requests.Session()
+    if username:
+        session.auth = (username, password or "")
+    base = node.rstrip("/")
+    response = session.post(
+        f"{base}/{index}/_search",
+        params={"scroll": "2m"},
+        json={"size": batch_size, "_source": ["embedding"], "sort": ["_doc"]},
+        timeout=60,
+    )
+    scroll_id = None
+    try:
+        while True:
+            response.raise_for_status()
+            data = response.json()
+            scroll_id = data.get("_scroll_id")
+            hits = data["hits"]["hits"]
+            if not hits:
+                break
+            for hit in hits:
+                embedding = hit.get("_source", {}).get("embedding")
+                if embedding:
+                    yield hit["_id"], embedding
+            response = session.post(
+                f"{base}/_search/scroll",
+                json={"scroll": "2m", "scroll_id": scroll_id},
+                timeout=60,
+            )
+    finally:
+        if scroll_id:
+            session.delete(
+                f"{base}/_search/scroll", json={"scroll_id": scroll_id}, timeout=10
+            )
+
+
+def collect(pairs):
+    """Split (id, embedding) pairs into an id list and a float32 matrix"""
+    ids, rows = [], []
+    for post_id, embedding in pairs:
+        ids.append(post_id)
+        rows.append(np.asarray(embedding, dtype=np.float32))
+    return ids, np.vstack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precomputed related posts")
+    parser.add_argument(
+        "--index-path",
+        default=os.environ.get("RELATED_POSTS_PATH"),
+        required=not os.environ.get("RELATED_POSTS_PATH"),
+        help="Related posts SQLite file",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Update the table from the embeddings in Elasticsearch (or --file)",
+    )
+    parser.add_argument("--file", help="Read embeddings from a bulk NDJSON file")
+    parser.add_argument(
+        "--node",
+        default=os.environ.get("ELASTICSEARCH_NODE", "http://localhost:9200"),
+        help="Elasticsearch node URL",
+    )
+    parser.add_argument("--username", default=os.environ.get("ELASTICSEARCH_USERNAME"))
+    parser.add_argument("--password", default=os.environ.get("ELASTICSEARCH_PASSWORD"))
+    parser.add_argument("--index", default="blog-posts")
+    parser.add_argument("--k", type=int, default=K, help="Neighbours per post")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Recompute every neighbour list"
+    )
+    parser.add_argument("--lookup", help="Print the related posts of this post id")
+    parser.add_argument("--limit", type=int, help="Maximum related posts to print")
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+    index = open_related(args.index_path)
+
+    if args.sync or args.rebuild:
+        t0 = time.perf_counter()
+        if args.file:
+            with open(args.file, "r", encoding="utf-8") as f:
+                ids, vectors = collect(iter_bulk_embeddings(f))
+        else:
+            ids, vectors = collect(
+                iter_es_embeddings(args.node, args.index, args.username, args.password)
+            )
+        log_debug(
+            debug, f"read {len(ids)} embeddings in {time.perf_counter() - t0:.2f}s"
+        )
+        summary = index.sync(
+            ids,
+            vectors,
+            args.k,
+            args.block_size,
+            force_rebuild=args.rebuild,
+            debug=debug,
+        )
+        print(json.dumps(summary, indent=2))
+
+    if args.lookup:
+        print(json.dumps(index.lookup(args.lookup, args.limit)))
+
+
+if __name__ == "__main__":
+    main()
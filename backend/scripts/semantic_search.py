@@ -5,34 +5,137 @@ Advanced NLP-based semantic understanding for complex queries
 """
 
 import argparse
-import json
+import heapq
+import itertools
+import multiprocessing
 import os
 import re
 import sys
+import time
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any, Dict, List, Tuple
 
+import metrics
 import numpy as np
+from codec import FORMATS, decode, encode
 
 # NLP Libraries
-import spacy
-from sentence_transformers import SentenceTransformer, util
+import torch
+from embed_text import MODEL_NAME, get_model
+from embedding_cache import encode_queries
+from gazetteer import build_gazetteer
+from records import CandidateBatch, pre_scores
+from sentence_transformers import util
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
-# Load spaCy model for NLP processing
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    print("Installing spaCy model...")
-    os.system("python -m spacy download en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+# "spacy" (en_core_web_sm entities) or "gazetteer" (never imports spaCy)
+ANALYZER = os.environ.get("QUERY_ANALYZER", "spacy")
+ANALYZERS = ("spacy", "gazetteer")
+
+# Lazy global spaCy pipeline
+nlp = None
+
+
+def get_nlp():
+    """Load the spaCy model for NLP processing on first use"""
+    global nlp
+    if nlp is None:
+        import spacy
+
+        with metrics.span("spacy_load"):
+            try:
+                nlp = spacy.load("en_core_web_sm")
+            except OSError:
+                print("Installing spaCy model...")
+                os.system("python -m spacy download en_core_web_sm")
+                nlp = spacy.load("en_core_web_sm")
+    return nlp
+
+
+# Below this many candidates, shipping shards to workers costs more than it saves
+PARALLEL_MIN_CANDIDATES = 2000
+
+
+class LexicalScorer:
+    """
+    Lexical/domain scoring compiled for one query. Holds only term lists, so
+    it pickles cheaply to shard workers. Scores are accumulated in the same
+    order as always, so they are bit-for-bit identical.
+    """
+
+    ONCE, EACH, COUNT = "once", "each", "count"
+
+    __slots__ = ("companies", "domain_ops", "expanded_terms")
+
+    def __init__(self, companies, domain_ops, expanded_terms):
+        self.companies = companies
+        self.domain_ops = domain_ops
+        self.expanded_terms = expanded_terms
+
+    def score(self, result_text: str) -> Tuple[float, float, float]:
+        company_bonus = 0
+        for company, extra_terms in self.companies:
+            if company in result_text:
+                company_bonus += 5  # High bonus for exact company match
+                for term in extra_terms:
+                    if term in result_text:
+                        company_bonus += 1
+
+        domain_score = 0
+        for op, terms, weight in self.domain_ops:
+            if op == self.COUNT:
+                domain_score += sum(1 for term in terms if term in result_text) * weight
+            else:
+                for term in terms:
+                    if term in result_text:
+                        domain_score += weight
+
+        expanded_matches = sum(1 for term in self.expanded_terms if term in result_text)
+        return domain_score, company_bonus, expanded_matches * 0.5
+
+
+def score_shard(scorer: LexicalScorer, texts, original, start: int, top_n: int = None):
+    """
+    Score one contiguous shard of candidate texts. Returns the shard's score
+    columns and its best (-pre_score, index) pairs in ascending order.
+    """
+    n = len(texts)
+    domain, company, expanded = np.zeros(n), np.zeros(n), np.zeros(n)
+    for i, text in enumerate(texts):
+        domain[i], company[i], expanded[i] = scorer.score(text.lower())
+    pre = pre_scores(domain, company, expanded, original)
+    order = np.argsort(-pre, kind="stable")
+    if top_n:
+        order = order[:top_n]
+    return start, domain, company, expanded, [(-pre[i], start + int(i)) for i in order]
 
 
 class SemanticSearchEngine:
-    def __init__(self, debug: bool = False):
+    def __init__(
+        self,
+        debug: bool = False,
+        rerank_top_n: int = None,
+        rerank_budget_ms: float = None,
+        rerank_batch_size: int = 32,
+        model=None,
+        lexical_workers: int = 0,
+        analyzer: str = None,
+    ):
         self.debug = debug
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.analyzer = analyzer or ANALYZER
+        if self.analyzer not in ANALYZERS:
+            raise ValueError(f"unknown analyzer: {self.analyzer}")
+        # Cascade reranking: encode only the top N pre-scored candidates
+        self.rerank_top_n = rerank_top_n
+        self.rerank_budget_ms = rerank_budget_ms
+        self.rerank_batch_size = rerank_batch_size
+        # Shard lexical scoring of large candidate sets across processes
+        self.lexical_workers = lexical_workers
+        self._pool = None
+        # Share the embedding model loaded by embed_text (one copy per process)
+        self.model = model if model is not None else get_model(debug)
 
         # Domain-specific knowledge base
         self.tech_domains = {
@@ -463,14 +566,31 @@ class SemanticSearchEngine:
             },
         }
 
+        # Load the entity analyzer up front (before prefork_server forks)
+        if self.analyzer == "gazetteer":
+            self.gazetteer = build_gazetteer(self.company_contexts)
+        else:
+            get_nlp()
+
     def log_debug(self, *args):
         if self.debug:
             print("[semantic_search][DEBUG]", *args, file=sys.stderr, flush=True)
 
+    def named_entities(self, query: str) -> List[Tuple[str, str]]:
+        """(text, label) pairs from spaCy or from the gazetteer"""
+        if self.analyzer == "gazetteer":
+            # The original case lets "Slack" match while "slack" does not
+            with metrics.span("gazetteer_lookup"):
+                return [
+                    (text.lower(), label)
+                    for text, label in self.gazetteer.entities(query)
+                ]
+        with metrics.span("spacy_parse"):
+            doc = nlp(query.lower())
+        return [(ent.text, ent.label_) for ent in doc.ents]
+
     def extract_entities(self, query: str) -> Dict[str, Any]:
         """Extract named entities and context from query"""
-        doc = nlp(query.lower())
-
         entities = {
             "companies": [],
             "technologies": [],
@@ -480,11 +600,11 @@ class SemanticSearchEngine:
         }
 
         # Extract named entities
-        for ent in doc.ents:
-            if ent.label_ in ["ORG", "PRODUCT"]:
-                entities["companies"].append(ent.text)
-            elif ent.label_ in ["GPE", "LOC"]:
-                entities["other_entities"].append(ent.text)
+        for text, label in self.named_entities(query):
+            if label in ["ORG", "PRODUCT"]:
+                entities["companies"].append(text)
+            elif label in ["GPE", "LOC"]:
+                entities["other_entities"].append(text)
 
         # Extract potential company names (capitalized words)
         words = query.split()
@@ -511,8 +631,6 @@ class SemanticSearchEngine:
 
     def extract_intent(self, query: str) -> Dict[str, Any]:
         """Extract user intent from query"""
-        doc = nlp(query.lower())
-
         intent = {
             "primary_intent": "information",
             "secondary_intents": [],
@@ -624,7 +742,8 @@ class SemanticSearchEngine:
     def expand_query_semantically(self, query: str) -> Dict[str, Any]:
         """Expand query with semantic understanding"""
         intent = self.extract_intent(query)
-        domains = self.extract_domains(query)
+        with metrics.span("domain_extraction"):
+            domains = self.extract_domains(query)
         entities = self.extract_entities(query)
 
         # Build expanded query components
@@ -710,140 +829,212 @@ class SemanticSearchEngine:
         self.log_debug(f"Semantic query: {semantic_query}")
         return semantic_query
 
+    def compile_lexical(self, semantic_query: Dict) -> "LexicalScorer":
+        """
+        Resolve the query's entities, domain weights and expanded terms
+        against the knowledge base into plain term lists, once per query
+        """
+        companies = []
+        entities = semantic_query.get("entities", {})
+        for company in entities.get("companies", []):
+            context = self.company_contexts.get(company.lower())
+            extra = context["keywords"] + context["related_tech"] if context else []
+            companies.append((company.lower(), extra))
+
+        domain_ops = []
+        for domain, weight in semantic_query["domain_weights"].items():
+            if domain.startswith("company_"):
+                # Company domain - double weight for company matches
+                company = domain.replace("company_", "")
+                domain_ops.append((LexicalScorer.ONCE, [company], weight * 2))
+            elif domain.startswith("non_tech_"):
+                # Non-tech domain - every matching term adds the weight
+                non_tech_domain = domain.replace("non_tech_", "")
+                if non_tech_domain in self.non_tech_domains:
+                    context = self.non_tech_domains[non_tech_domain]
+                    terms = (
+                        context["keywords"]
+                        + context["tech_concepts"]
+                        + context["related_tech"]
+                    )
+                    domain_ops.append((LexicalScorer.EACH, terms, weight))
+            elif domain in self.tech_domains:
+                # Tech domain - number of matching terms times the weight
+                tech = self.tech_domains[domain]
+                terms = tech["keywords"] + tech["concepts"] + tech["technologies"]
+                domain_ops.append((LexicalScorer.COUNT, terms, weight))
+
+        expanded_terms = [
+            term.lower() for term in semantic_query.get("expanded_terms", [])
+        ]
+        return LexicalScorer(companies, domain_ops, expanded_terms)
+
+    def _lexical_pool(self):
+        if self._pool is None:
+            # Forked workers inherit the loaded modules instead of
+            # re-importing torch and spaCy
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            self._pool = ProcessPoolExecutor(
+                self.lexical_workers,
+                mp_context=context,
+                initializer=metrics.worker_init,
+            )
+        return self._pool
+
+    def close(self):
+        """Shut down the lexical scoring pool, if one was started"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def score_candidates(
+        self, batch: CandidateBatch, scorer: "LexicalScorer", top_n: int = None
+    ):
+        """
+        Fill the batch's lexical score columns and return the indices of the
+        `top_n` best pre-scored candidates (all when falsy), best first.
+        Large batches are split into shards scored in a process pool and
+        merged through a heap, with the same result as the serial path.
+        """
+        workers = self.lexical_workers
+        if workers <= 1 or len(batch) < PARALLEL_MIN_CANDIDATES:
+            _, batch.domain, batch.company, batch.expanded, top = score_shard(
+                scorer, batch.texts, batch.original, 0, top_n
+            )
+            return [i for _, i in top]
+
+        shard_size = -(-len(batch) // workers)
+        futures = [
+            self._lexical_pool().submit(
+                score_shard,
+                scorer,
+                batch.texts[start : start + shard_size],
+                batch.original[start : start + shard_size],
+                start,
+                top_n,
+            )
+            for start in range(0, len(batch), shard_size)
+        ]
+        tops = []
+        for future in futures:
+            start, domain, company, expanded, top = future.result()
+            end = start + len(domain)
+            batch.domain[start:end] = domain
+            batch.company[start:end] = company
+            batch.expanded[start:end] = expanded
+            tops.append(top)
+        merged = heapq.merge(*tops)
+        if top_n:
+            merged = itertools.islice(merged, top_n)
+        return [i for _, i in merged]
+
+    def embed_queries(self, semantic_query: Dict) -> Dict[str, List[float]]:
+        """
+        Embeddings of the raw query (for the ES vector search) and of the
+        expanded semantic query (for reranking), from one batched encode call.
+        Both land in the shared query-embedding cache.
+        """
+        texts = [semantic_query["original_query"], semantic_query["semantic_query"]]
+        query_vec, semantic_vec = encode_queries(lambda: self.model, MODEL_NAME, texts)
+        return {
+            "query_embedding": query_vec.tolist(),
+            "semantic_query_embedding": semantic_vec.tolist(),
+        }
+
     def rank_results_semantically(
-        self, results: List[Dict], semantic_query: Dict
+        self,
+        results: List[Dict],
+        semantic_query: Dict,
+        top_n: int = None,
+        budget_ms: float = None,
     ) -> List[Dict]:
-        """Rank results based on semantic relevance"""
+        """
+        Rank results based on semantic relevance.
+
+        Two-stage cascade: every candidate gets the cheap lexical/domain
+        pre-score, then only the `top_n` best pre-scored candidates are
+        encoded. With a `budget_ms`, survivors are encoded in batches until
+        the budget runs out. Encoded results always rank above the rest, and
+        their scores are identical to encoding the whole candidate list.
+        """
         if not results:
             return results
 
-        # Get embeddings for results
-        result_texts = [
-            f"{r.get('title', '')} {r.get('description', '')} {' '.join(r.get('tags', []))} {' '.join(r.get('themes', []))}"
-            for r in results
-        ]
-        result_embeddings = self.model.encode(result_texts, convert_to_tensor=True)
-
-        # Get embedding for semantic query
-        query_embedding = self.model.encode(
-            semantic_query["semantic_query"], convert_to_tensor=True
+        top_n = top_n if top_n is not None else self.rerank_top_n
+        budget_ms = budget_ms if budget_ms is not None else self.rerank_budget_ms
+        t_start = time.perf_counter()
+
+        batch = CandidateBatch(results)
+        metrics.incr("candidates", len(batch))
+
+        # Stage 1: lexical and domain pre-score over every candidate
+        scoring_t0 = time.perf_counter()
+        survivors = np.asarray(
+            self.score_candidates(
+                batch,
+                self.compile_lexical(semantic_query),
+                top_n if top_n and top_n > 0 else None,
+            ),
+            dtype=np.intp,
         )
+        metrics.record("scoring", time.perf_counter() - scoring_t0)
+
+        # Stage 2: embedding similarity for the survivors only
+        query_embedding = torch.as_tensor(
+            encode_queries(
+                lambda: self.model, MODEL_NAME, [semantic_query["semantic_query"]]
+            )[0],
+            device=self.model.device,
+        )
+        with metrics.span("encode"):
+            batch_size = self.rerank_batch_size if budget_ms else len(survivors)
+            for start in range(0, len(survivors), batch_size):
+                elapsed_ms = (time.perf_counter() - t_start) * 1000
+                if budget_ms and start > 0 and elapsed_ms >= budget_ms:
+                    metrics.incr("rerank_budget_exhausted")
+                    self.log_debug(
+                        f"rerank budget exhausted after {start}/{len(survivors)} candidates"
+                    )
+                    break
+                chunk = survivors[start : start + batch_size]
+                result_embeddings = self.model.encode(
+                    [batch.texts[i] for i in chunk], convert_to_tensor=True
+                )
+                batch.semantic[chunk] = (
+                    util.pytorch_cos_sim(query_embedding, result_embeddings)[0]
+                    .cpu()
+                    .numpy()
+                )
+                batch.encoded[chunk] = True
+        metrics.incr("candidates_encoded", int(batch.encoded.sum()))
 
-        # Calculate semantic similarity
-        similarities = util.pytorch_cos_sim(query_embedding, result_embeddings)[0]
-
-        # Calculate domain relevance
-        for i, result in enumerate(results):
-            result_text = result_texts[i].lower()
-
-            # Domain relevance score
-            domain_score = 0
-            company_bonus = 0
-
-            # Check for company-specific content
-            entities = semantic_query.get("entities", {})
-            for company in entities.get("companies", []):
-                if company.lower() in result_text:
-                    company_bonus += 5  # High bonus for exact company match
-                    # Add bonus for company-related terms
-                    if company.lower() in self.company_contexts:
-                        context = self.company_contexts[company.lower()]
-                        for keyword in context["keywords"]:
-                            if keyword in result_text:
-                                company_bonus += 1
-                        for tech in context["related_tech"]:
-                            if tech in result_text:
-                                company_bonus += 1
-
-            # Check domain relevance
-            for domain, weight in semantic_query["domain_weights"].items():
-                if domain.startswith("company_"):
-                    # Company domain - check for company-specific terms
-                    company = domain.replace("company_", "")
-                    if company in result_text:
-                        domain_score += weight * 2  # Double weight for company matches
-                elif domain.startswith("non_tech_"):
-                    # Non-tech domain - check for domain-specific terms
-                    non_tech_domain = domain.replace("non_tech_", "")
-                    if non_tech_domain in self.non_tech_domains:
-                        context = self.non_tech_domains[non_tech_domain]
-                        for keyword in context["keywords"]:
-                            if keyword in result_text:
-                                domain_score += weight
-                        for concept in context["tech_concepts"]:
-                            if concept in result_text:
-                                domain_score += weight
-                        for tech in context["related_tech"]:
-                            if tech in result_text:
-                                domain_score += weight
-                else:
-                    # Tech domain - check for tech terms
-                    if domain in self.tech_domains:
-                        domain_keywords = self.tech_domains[domain]["keywords"]
-                        domain_concepts = self.tech_domains[domain]["concepts"]
-                        domain_techs = self.tech_domains[domain]["technologies"]
-
-                        matches = sum(
-                            1
-                            for term in domain_keywords + domain_concepts + domain_techs
-                            if term in result_text
-                        )
-                        domain_score += matches * weight
-
-            # Check for expanded terms in the result
-            expanded_terms = semantic_query.get("expanded_terms", [])
-            expanded_matches = sum(
-                1 for term in expanded_terms if term.lower() in result_text
-            )
-            expanded_bonus = expanded_matches * 0.5
-
-            # Combine semantic similarity with domain relevance
-            semantic_score = float(similarities[i])
-            combined_score = (
-                semantic_score * 0.6
-                + (min(domain_score / 10, 1.0) * 0.3)
-                + (min(company_bonus / 10, 1.0) * 0.1)
-                + (min(expanded_bonus / 10, 1.0) * 0.1)
-                + result.get("score", 0) * 0.5
-            )
-
-            result["semantic_score"] = combined_score
-            result["domain_score"] = domain_score
-            result["company_bonus"] = company_bonus
-            result["expanded_bonus"] = expanded_bonus
-            result["original_score"] = result.get("score", 0)
-            result["score"] = combined_score
-
-        # Sort by combined score
-        results.sort(key=lambda x: x["score"], reverse=True)
+        # Combine semantic similarity with domain relevance, encoded
+        # candidates first
+        batch.combine()
+        results[:] = batch.to_results(batch.ranking())
 
         return results
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Semantic search engine")
-    parser.add_argument("--query", required=True, help="Natural language query")
-    parser.add_argument("--results", help="JSON file with search results")
-    parser.add_argument(
-        "--analysis-only",
-        action="store_true",
-        help="Only perform semantic analysis, don't rank results",
-    )
-    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
-
-    args = parser.parse_args()
-    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+def write_output(output, fmt: str = "json", pretty: bool = False):
+    sys.stdout.buffer.write(encode(output, fmt, pretty))
+    if fmt == "json":
+        sys.stdout.buffer.write(b"\n")
+    sys.stdout.buffer.flush()
 
-    # Initialize semantic search engine
-    engine = SemanticSearchEngine(debug=debug)
 
+def run(engine: SemanticSearchEngine, args):
+    """Analyze the query, rank the results if given, and write the output"""
     # Process query
     semantic_query = engine.expand_query_semantically(args.query)
 
+    embeddings = engine.embed_queries(semantic_query) if args.with_embeddings else {}
+
     # If analysis-only mode, just return the semantic analysis
     if args.analysis_only:
-        output = {"semantic_analysis": semantic_query}
-        print(json.dumps(output, indent=2, ensure_ascii=False))
+        output = {"semantic_analysis": semantic_query, **embeddings}
+        write_output(output, args.output_format, args.pretty)
         return
 
     # Load results if provided
@@ -852,8 +1043,11 @@ def main():
         return
 
     try:
-        with open(args.results, "r") as f:
-            results = json.load(f)
+        if args.results == "-":
+            results = decode(sys.stdin.buffer.read(), args.input_format)
+        else:
+            with open(args.results, "rb") as f:
+                results = decode(f.read(), args.input_format)
     except Exception as e:
         print(f"Error loading results: {e}")
         return
@@ -865,9 +1059,85 @@ def main():
     output = {
         "semantic_analysis": semantic_query,
         "ranked_results": ranked_results[:25],  # Top 10 results
+        **embeddings,
     }
 
-    print(json.dumps(output, indent=2, ensure_ascii=False))
+    write_output(output, args.output_format, args.pretty)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic search engine")
+    parser.add_argument("--query", required=True, help="Natural language query")
+    parser.add_argument(
+        "--results", help="File with search results ('-' to read them from stdin)"
+    )
+    parser.add_argument(
+        "--input-format",
+        choices=FORMATS,
+        default="json",
+        help="Encoding of the search results",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=FORMATS,
+        default="json",
+        help="Encoding of the output",
+    )
+    parser.add_argument(
+        "--pretty", action="store_true", help="Indent JSON output for reading"
+    )
+    parser.add_argument(
+        "--analysis-only",
+        action="store_true",
+        help="Only perform semantic analysis, don't rank results",
+    )
+    parser.add_argument(
+        "--with-embeddings",
+        action="store_true",
+        help="Include the query and semantic query embeddings in the output",
+    )
+    parser.add_argument(
+        "--rerank-top-n",
+        type=int,
+        default=int(os.environ.get("RERANK_TOP_N", "0")),
+        help="Only encode the N best lexically pre-scored candidates (0 = all)",
+    )
+    parser.add_argument(
+        "--rerank-budget-ms",
+        type=float,
+        default=float(os.environ.get("RERANK_BUDGET_MS", "0")),
+        help="Stop encoding candidates once this latency budget is spent (0 = none)",
+    )
+    parser.add_argument(
+        "--lexical-workers",
+        type=int,
+        default=int(os.environ.get("LEXICAL_WORKERS", "0")),
+        help=f"Score candidate sets of {PARALLEL_MIN_CANDIDATES}+ in this many processes",
+    )
+    parser.add_argument(
+        "--analyzer",
+        choices=ANALYZERS,
+        default=ANALYZER,
+        help="Entity analyzer: spaCy, or the spaCy-free gazetteer",
+    )
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    # Initialize semantic search engine
+    engine = SemanticSearchEngine(
+        debug=debug,
+        rerank_top_n=args.rerank_top_n or None,
+        rerank_budget_ms=args.rerank_budget_ms or None,
+        lexical_workers=args.lexical_workers,
+        analyzer=args.analyzer,
+    )
+
+    try:
+        run(engine, args)
+    finally:
+        engine.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Search Suggestions
+Prefix autocomplete over post titles, the theme/tag taxonomy and popular
+search queries, weighted by frequency
+
+Suggestions are persisted in a SQLite table and held in memory as sorted
+parallel arrays, so a lookup is two binary searches plus a top-k over the
+matching range. The top suggestions for very short prefixes, whose ranges
+cover a large part of the index, are precomputed.
+"""
+
+import argparse
+import bisect
+import heapq
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+DEFAULT_LIMIT = 10
+# Prefixes up to this length answer from a precomputed table
+SHORT_PREFIX = 2
+
+TITLE_WEIGHT = 1.0
+TAG_WEIGHT = 3.0
+THEME_WEIGHT = 5.0
+QUERY_WEIGHT = 2.0
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[suggest][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def normalize(text: str) -> str:
+    return _SPACE_RE.sub(" ", text or "").strip().lower()
+
+
+def taxonomy_entries(themes):
+    """(text, kind, weight) for theme names and their comma-separated tags"""
+    for name, tags in themes:
+        yield name, "theme", THEME_WEIGHT
+        for tag in (tags or "").split(","):
+            if tag.strip():
+                yield tag.strip(), "tag", TAG_WEIGHT
+
+
+def title_entries(titles):
+    for title in titles:
+        yield title, "title", TITLE_WEIGHT
+
+
+def query_entries(queries):
+    """`queries` as (query, count) pairs"""
+    for query, count in queries:
+        yield query, "query", QUERY_WEIGHT * count
+
+
+def _merge(entries):
+    """Entries keyed by normalized text, with duplicate weights summed"""
+    merged = {}
+    for text, kind, weight in entries:
+        key = normalize(text)
+        if not key:
+            continue
+        if key in merged:
+            merged[key][2] += weight
+        else:
+            merged[key] = [text.strip(), kind, weight]
+    return merged
+
+
+class SuggestIndex:
+    """
+    With `load` False the in-memory arrays are only read on the first
+    lookup, so a writer such as fetch_rss.py can add entries cheaply.
+    """
+
+    def __init__(self, path: str, load: bool = True):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS suggestions ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, kind TEXT NOT NULL, "
+            "weight REAL NOT NULL)"
+        )
+        self.keys = None
+        if load:
+            self._load()
+
+    def _load(self):
+        self.keys, self.texts, self.kinds, self.weights = [], [], [], []
+        for key, text, kind, weight in self._db.execute(
+            "SELECT key, text, kind, weight FROM suggestions ORDER BY key"
+        ):
+            self.keys.append(key)
+            self.texts.append(text)
+            self.kinds.append(kind)
+            self.weights.append(weight)
+        self._short = None
+
+    def __len__(self):
+        if self.keys is None:
+            self._load()
+        return len(self.keys)
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM suggestions").fetchone()[0]
+
+    def _insert(self, merged, increase: bool):
+        self._db.executemany(
+            "INSERT INTO suggestions VALUES (?, ?, ?, ?) ON CONFLICT (key) DO "
+            + (
+                "UPDATE SET weight = weight + excluded.weight"
+                if increase
+                else "NOTHING"
+            ),
+            [(key, *values) for key, values in merged.items()],
+        )
+
+    def add(self, entries, increase: bool = True):
+        """
+        Add (text, kind, weight) entries. With `increase`, the weight of a
+        suggestion already in the index grows by the new weight; otherwise
+        it is left as is, so re-adding the same titles on every poll does
+        not inflate them. Returns the number of new suggestions.
+        """
+        merged = _merge(entries)
+        if not merged:
+            return 0
+
+        with self._db:
+            self._db.execute("BEGIN")
+            before = self._count() if self.keys is None else 0
+            self._insert(merged, increase)
+            if self.keys is None:
+                return self._count() - before
+
+        if len(merged) > len(self.keys) // 8:
+            # Large batches: re-read the sorted table instead of inserting
+            # into the middle of the arrays one by one
+            before = len(self.keys)
+            self._load()
+            return len(self.keys) - before
+
+        added = 0
+        for key, (text, kind, weight) in merged.items():
+            i = bisect.bisect_left(self.keys, key)
+            if i < len(self.keys) and self.keys[i] == key:
+                if increase:
+                    self.weights[i] += weight
+                continue
+            self.keys.insert(i, key)
+            self.texts.insert(i, text)
+            self.kinds.insert(i, kind)
+            self.weights.insert(i, weight)
+            added += 1
+        self._short = None
+        return added
+
+    def rebuild(self, entries):
+        """Replace the whole index with `entries` in one transaction"""
+        merged = _merge(entries)
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM suggestions")
+            self._insert(merged, increase=True)
+        self._load()
+        return len(self.keys)
+
+    def _range(self, prefix: str):
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\U0010ffff", lo)
+        return lo, hi
+
+    def _top(self, lo: int, hi: int, limit: int):
+        # nlargest is stable, so equal weights come out in key order
+        return heapq.nlargest(limit, range(lo, hi), key=self.weights.__getitem__)
+
+    def _short_table(self):
+        if self._short is None:
+            table = {}
+            for length in range(1, SHORT_PREFIX + 1):
+                for prefix in {key[:length] for key in self.keys}:
+                    table[prefix] = self._top(*self._range(prefix), DEFAULT_LIMIT)
+            self._short = table
+        return self._short
+
+    def lookup(self, prefix: str, limit: int = DEFAULT_LIMIT):
+        """Best `limit` suggestions starting with `prefix`, heaviest first"""
+        prefix = normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+        if self.keys is None:
+            self._load()
+        if len(prefix) <= SHORT_PREFIX and limit <= DEFAULT_LIMIT:
+            top = self._short_table().get(prefix, [])[:limit]
+        else:
+            top = self._top(*self._range(prefix), limit)
+        return [
+            {"text": self.texts[i], "kind": self.kinds[i], "weight": self.weights[i]}
+            for i in top
+        ]
+
+
+def open_suggest(path: str = None, load: bool = True):
+    """SuggestIndex at `path` or SUGGEST_INDEX_PATH, or None when unset"""
+    path = path or os.environ.get("SUGGEST_INDEX_PATH")
+    if not path:
+        return None
+    return SuggestIndex(path, load)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search-as-you-type suggestions")
+    parser.add_argument(
+        "--index",
+        default=os.environ.get("SUGGEST_INDEX_PATH"),
+        required=not os.environ.get("SUGGEST_INDEX_PATH"),
+        help="Suggestion index file",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Rebuild from post titles, themes and search history in the database",
+    )
+    parser.add_argument("--prefix", help="Print suggestions for this prefix")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+    index = open_suggest(args.index)
+
+    if args.rebuild:
+        from db_service import get_popular_queries, get_post_titles, get_themes_and_tags
+
+        t0 = time.perf_counter()
+        count = index.rebuild(
+            [
+                *taxonomy_entries(get_themes_and_tags()),
+                *title_entries(get_post_titles()),
+                *query_entries(get_popular_queries()),
+            ]
+        )
+        log_debug(
+            debug, f"indexed {count} suggestions in {time.perf_counter() - t0:.2f}s"
+        )
+
+    if args.prefix is not None:
+        t0 = time.perf_counter()
+        suggestions = index.lookup(args.prefix, args.limit)
+        log_debug(debug, f"lookup took {(time.perf_counter() - t0) * 1e6:.1f}us")
+        print(json.dumps(suggestions))
+
+
+if __name__ == "__main__":
+    main()
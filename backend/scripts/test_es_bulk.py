@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Bulk Loader Tests
+BulkLoader against a local HTTP stand-in for `_bulk` that answers from a
+script of responses: whole-request failures, partial item failures, retries
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from es_bulk import BulkLoader, to_bulk_lines
+
+
+class BulkStandIn:
+    """
+    Serves `_bulk` from `script`: each entry is an HTTP status, or a callable
+    mapping the request's document ids to per-item statuses. Every request's
+    ids are recorded in `requests`.
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                lines = body.decode("utf-8").splitlines()
+                ids = [json.loads(line)["index"]["_id"] for line in lines[::2]]
+                stand_in.requests.append(ids)
+                step = stand_in.script.pop(0) if stand_in.script else (lambda i: 201)
+                if isinstance(step, int):
+                    self._reply(step, {"error": "unavailable"})
+                    return
+                items = []
+                for _id in ids:
+                    status = step(_id)
+                    result = {"_id": _id, "status": status}
+                    if status >= 300:
+                        result["error"] = {"type": f"error_{status}"}
+                    items.append({"index": result})
+                errors = any(item["index"]["status"] >= 300 for item in items)
+                self._reply(200, {"errors": errors, "items": items})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.node = f"http://127.0.0.1:{self.server.server_port}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def pairs(n):
+    posts = [
+        {"id": f"p{i}", "url": f"https://example.com/{i}", "title": f"Post {i}"}
+        for i in range(n)
+    ]
+    return list(to_bulk_lines(posts, id_field="id"))
+
+
+def test_partial_failures_retry_only_retryable_items():
+    stand_in = BulkStandIn(
+        [
+            lambda _id: {"p1": 429, "p2": 400}.get(_id, 201),
+            lambda _id: 201,
+        ]
+    )
+    try:
+        summary = BulkLoader(stand_in.node, backoff_s=0).load(pairs(4))
+    finally:
+        stand_in.close()
+    assert stand_in.requests == [["p0", "p1", "p2", "p3"], ["p1"]]
+    assert summary["sent"] == 4
+    assert summary["failed"] == 1
+    assert summary["retries"] == 1
+    assert summary["errors"] == [{"status": 400, "error": {"type": "error_400"}}]
+
+
+def test_whole_request_failures_are_retried():
+    stand_in = BulkStandIn([503, 500, lambda _id: 201])
+    try:
+        summary = BulkLoader(stand_in.node, backoff_s=0).load(pairs(3))
+    finally:
+        stand_in.close()
+    assert len(stand_in.requests) == 3
+    assert stand_in.requests[-1] == ["p0", "p1", "p2"]
+    assert summary["failed"] == 0
+    assert summary["retries"] == 2
+
+
+def test_retry_budget_is_bounded():
+    stand_in = BulkStandIn([lambda _id: 429] * 10)
+    try:
+        summary = BulkLoader(stand_in.node, max_retries=2, backoff_s=0).load(pairs(2))
+    finally:
+        stand_in.close()
+    assert len(stand_in.requests) == 3
+    assert summary["failed"] == 2
+    assert summary["errors"][0]["status"] == 429
+
+
+def test_connection_errors_are_retried_then_reported():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    loader = BulkLoader(f"http://127.0.0.1:{port}", max_retries=2, backoff_s=0)
+    summary = loader.load(pairs(2))
+    assert summary["requests"] == 3
+    assert summary["failed"] == 2
+    assert summary["errors"][0]["status"] is None
+    assert summary["errors"][0]["error"].startswith("ConnectionError")
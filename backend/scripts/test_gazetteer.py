@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Gazetteer Tests
+Whole-word matching and the case-sensitive entries that are also ordinary
+words
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from gazetteer import build_gazetteer, word_pattern
+
+
+def test_ambiguous_entries_need_their_capitalization():
+    gazetteer = build_gazetteer()
+    assert (
+        gazetteer.entities("let us zoom in on slack time in windows and chrome") == []
+    )
+    assert gazetteer.entities("Slack and Zoom outages in the US") == [
+        ("Slack", "ORG"),
+        ("Zoom", "ORG"),
+        ("US", "GPE"),
+    ]
+
+
+def test_other_entries_ignore_case():
+    assert build_gazetteer().entities("GOOGLE and hugging  face in new york") == [
+        ("GOOGLE", "ORG"),
+        ("hugging  face", "ORG"),
+        ("new york", "GPE"),
+    ]
+
+
+def test_entries_match_whole_words_only():
+    gazetteer = build_gazetteer()
+    assert gazetteer.entities("Metadata for Intelligent Metaverse apps") == []
+    assert not word_pattern("meta").search("metadata and meta-learning")
+    assert word_pattern("meta").search("what meta's llama does")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Prefilter Tests
+Paywall teasers and feed footers against ordinary posts that only talk
+about subscriptions
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from prefilter import check
+
+ARTICLE = (
+    "We moved our search stack from a single Elasticsearch node to a small "
+    "cluster last quarter. The migration itself was uneventful, but the shard "
+    "layout we picked early on turned out to matter far more than the hardware. "
+    "In this post we walk through how we sized the shards, which queries got "
+    "slower before they got faster, and what we would do differently next time. "
+)
+
+
+def test_substack_teaser_is_boilerplate():
+    content = (
+        "Last week I promised a deeper look at how we price our API tiers and "
+        "why the free plan is more generous than it looks. Keep reading with a "
+        "7-day free trial. This post is for paid subscribers. Subscribe to keep "
+        "reading and get full access to the archive."
+    )
+    assert "boilerplate" in check("How we price our API", "", content)
+
+
+def test_members_only_footer_is_boilerplate():
+    content = ARTICLE + "The rest of this story is available to members only."
+    content += " Sign up now to read the full post."
+    assert "boilerplate" in check("Sizing Elasticsearch shards", "", content)
+
+
+def test_short_members_only_preview_is_boilerplate():
+    content = (
+        "Member-only story. Sizing Elasticsearch shards. A short preview of "
+        "the article."
+    )
+    assert check("Sizing Elasticsearch shards", "", content) == [
+        "boilerplate",
+        "too_short",
+    ]
+
+
+def test_feed_footer_only_is_boilerplate():
+    content = (
+        "We moved our search stack to a small cluster last quarter [...] "
+        "The post Sizing Elasticsearch shards appeared first on Example "
+        "Engineering Blog."
+    )
+    assert "boilerplate" in check("Sizing Elasticsearch shards", "", content)
+
+
+def test_article_mentioning_premium_subscribers_passes():
+    content = (
+        ARTICLE + "Search analytics used to be a feature for premium subscribers only, "
+        "so we rebuilt the dashboard on the new cluster and opened it to every "
+        "plan. " + ARTICLE * 3
+    )
+    assert check("Sizing Elasticsearch shards", "", content) == []
+
+
+def test_article_about_members_only_content_passes():
+    content = (
+        "Members-only content is a common pattern for newsletters, and the way "
+        "feeds expose it varies a lot between platforms. " + ARTICLE * 4
+    )
+    assert check("Paywalls in RSS feeds", "", content) == []
+
+
+def test_full_article_with_footer_passes():
+    content = (
+        ARTICLE * 3 + "The post Sizing Elasticsearch shards appeared first on "
+        "Example Engineering Blog."
+    )
+    assert check("Sizing Elasticsearch shards", "", content) == []
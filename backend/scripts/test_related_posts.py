@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Related Posts Tests
+Blocked k-NN against brute force, and the small-corpus padding cases
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from related_posts import RelatedIndex, normalize_rows, top_k_blocked
+
+
+def brute_force(vectors, k):
+    sims = vectors @ vectors.T
+    np.fill_diagonal(sims, -np.inf)
+    order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(sims, order, 1)
+
+
+def open_index():
+    return RelatedIndex(os.path.join(tempfile.mkdtemp(), "related.sqlite"))
+
+
+def test_blocked_matches_brute_force():
+    vectors = normalize_rows(np.random.default_rng(0).normal(size=(500, 16)))
+    expected_i, expected_s = brute_force(vectors, 10)
+    for block_size in (7, 64, 1024):
+        indices, scores = top_k_blocked(vectors, vectors, 10, block_size, 0)
+        assert np.allclose(scores, expected_s, atol=1e-5)
+        assert (indices == expected_i).all()
+
+
+def test_small_corpus_has_no_self_or_infinite_neighbours():
+    rng = np.random.default_rng(1)
+    index = open_index()
+    index.sync(["a", "b", "c"], rng.random((3, 8)), k=10)
+    for post_id in "abc":
+        neighbors = index.lookup(post_id)
+        assert len(neighbors) == 2
+        assert post_id not in [other for other, _ in neighbors]
+        assert all(np.isfinite(score) for _, score in neighbors)
+
+    # Incremental path: a new post with fewer than k other candidates
+    summary = index.sync(
+        ["a", "b", "c", "d"],
+        np.vstack([normalize_rows(index._load()[1]), rng.random((1, 8))]),
+        k=10,
+    )
+    assert summary["mode"] == "incremental"
+    for post_id in "abcd":
+        neighbors = index.lookup(post_id)
+        assert len(neighbors) == 3
+        assert post_id not in [other for other, _ in neighbors]
+    for (neighbors,) in index._db.execute("SELECT neighbors FROM related"):
+        assert "Infinity" not in neighbors
+        json.loads(neighbors)
+
+
+def test_incremental_matches_rebuild():
+    vectors = normalize_rows(np.random.default_rng(2).normal(size=(300, 16)))
+    ids = [f"p{i}" for i in range(300)]
+    incremental, full = open_index(), open_index()
+    incremental.sync(ids[:200], vectors[:200], k=5, block_size=32)
+    assert incremental.sync(ids, vectors, k=5, block_size=32)["mode"] == "incremental"
+    full.rebuild(ids, vectors, k=5, block_size=32)
+    for post_id in ids:
+        assert [i for i, _ in incremental.lookup(post_id)] == [
+            i for i, _ in full.lookup(post_id)
+        ]
+
+
+if __name__ == "__main__":
+    test_blocked_matches_brute_force()
+    test_small_corpus_has_no_self_or_infinite_neighbours()
+    test_incremental_matches_rebuild()
+    print("✅ related posts tests passed")
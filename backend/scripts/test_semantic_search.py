@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Semantic Search Tests
+Sharded lexical pre-scoring against the serial path, without loading the
+embedding model or spaCy
+"""
+
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from records import CandidateBatch
+from semantic_search import PARALLEL_MIN_CANDIDATES, SemanticSearchEngine
+
+WORDS = (
+    "machine learning neural network kubernetes docker google microsoft "
+    "react frontend database postgres latency scaling cloud aws python rust "
+    "startup funding marketing design security privacy the a of and with"
+).split()
+QUERIES = [
+    "machine learning at google",
+    "kubernetes scaling on aws",
+    "react frontend performance",
+]
+
+
+def make_results(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": str(i),
+            "title": " ".join(rng.choices(WORDS, k=6)),
+            "description": " ".join(rng.choices(WORDS, k=30)),
+            "tags": rng.sample(WORDS, 3),
+            # Coarse scores so that ties between candidates are common
+            "score": rng.randint(0, 5),
+        }
+        for i in range(n)
+    ]
+
+
+def make_engine(workers: int):
+    # The model is never touched by lexical scoring
+    return SemanticSearchEngine(
+        model=object(), lexical_workers=workers, analyzer="gazetteer"
+    )
+
+
+def test_parallel_ranking_matches_serial():
+    results = make_results(PARALLEL_MIN_CANDIDATES + 37)
+    serial, parallel = make_engine(0), make_engine(3)
+    try:
+        for query in QUERIES:
+            scorer = serial.compile_lexical(serial.expand_query_semantically(query))
+            for top_n in (None, 50):
+                expected, actual = CandidateBatch(results), CandidateBatch(results)
+                ranking = serial.score_candidates(expected, scorer, top_n)
+                assert parallel.score_candidates(actual, scorer, top_n) == ranking
+                for column in ("domain", "company", "expanded"):
+                    np.testing.assert_array_equal(
+                        getattr(actual, column), getattr(expected, column)
+                    )
+        assert parallel._pool is not None
+    finally:
+        parallel.close()
+    assert parallel._pool is None
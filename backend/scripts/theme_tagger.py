@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Theme Auto-Tagging
+Assigns themes to a post by comparing its embedding with one centroid
+embedding per theme, so tagging is a single matrix product whatever the size
+of the tag taxonomy
+
+A theme's centroid is the normalized mean of the embeddings of its name and
+of each of its tags. Centroids are cached in an .npz file keyed by the model
+and the themes table contents, and recomputed only when either changes.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import metrics
+import numpy as np
+
+# "literal" (tag strings in title/description), "embedding" or "both"
+MODE = os.environ.get("THEME_TAGGING_MODE", "literal")
+THRESHOLD = float(os.environ.get("THEME_TAG_THRESHOLD", "0.4"))
+MAX_THEMES = int(os.environ.get("THEME_TAG_MAX", "3"))
+CENTROIDS_PATH = os.environ.get(
+    "THEME_CENTROIDS_PATH",
+    os.path.join(tempfile.gettempdir(), "blog_search_theme_centroids.npz"),
+)
+
+
+def log_debug(enabled: bool, *args):
+    if enabled:
+        print("[theme_tagger][DEBUG]", *args, file=sys.stderr, flush=True)
+
+
+def theme_texts(themes):
+    """(theme name, [name, tag, tag, ...]) for each row of the themes table"""
+    for name, tags in themes:
+        yield name, [name] + [
+            tag.strip() for tag in (tags or "").split(",") if tag.strip()
+        ]
+
+
+def signature(model_name: str, themes) -> str:
+    payload = json.dumps([model_name, sorted(map(list, themes))])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ThemeTagger:
+    def __init__(self, names, centroids, threshold=THRESHOLD, max_themes=MAX_THEMES):
+        self.names = names
+        self.centroids = centroids
+        self.threshold = threshold
+        self.max_themes = max_themes
+
+    def scores(self, embedding):
+        """Cosine similarity of a normalized post embedding with every theme"""
+        return self.centroids @ np.asarray(embedding, dtype=np.float32)
+
+    def assign(self, embedding):
+        """Themes whose centroid is within the threshold, most similar first"""
+        if embedding is None or not len(self.names):
+            return []
+        scores = self.scores(embedding)
+        ranked = np.argsort(-scores, kind="stable")[: self.max_themes]
+        return [self.names[i] for i in ranked if scores[i] >= self.threshold]
+
+
+def build_centroids(themes, load_model):
+    """Theme names and their (n_themes, dims) matrix of unit centroids"""
+    names, groups = zip(*theme_texts(themes)) if themes else ((), ())
+    texts = [text for group in groups for text in group]
+    if not texts:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    # One batched encode for the whole taxonomy. It bypasses the query
+    # embedding cache: the centroids are persisted on their own, and theme
+    # texts would only take the slots and skew the hit rate of user queries
+    with metrics.span("encode"):
+        vectors = load_model().encode(texts, normalize_embeddings=True)
+    centroids, start = [], 0
+    for texts in groups:
+        mean = np.mean(vectors[start : start + len(texts)], axis=0)
+        centroids.append(mean / max(np.linalg.norm(mean), 1e-12))
+        start += len(texts)
+    return list(names), np.asarray(centroids, dtype=np.float32)
+
+
+def get_tagger(themes, load_model, model_name: str, path: str = None, debug=False):
+    """ThemeTagger for `themes`, from the centroid cache when it is current"""
+    path = path or CENTROIDS_PATH
+    key = signature(model_name, themes)
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as cached:
+            if str(cached["signature"]) == key:
+                log_debug(debug, f"theme centroids loaded from {path}")
+                return ThemeTagger(
+                    [str(name) for name in cached["names"]], cached["centroids"]
+                )
+
+    names, centroids = build_centroids(themes, load_model)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, signature=key, names=np.array(names), centroids=centroids)
+    os.replace(tmp_path, path)
+    log_debug(debug, f"computed {len(names)} theme centroids into {path}")
+    return ThemeTagger(names, centroids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding-based theme tagging")
+    parser.add_argument("--text", required=True, help="Text to tag")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument(
+        "--debug", action="store_true", help="Enable verbose debug logs to stderr"
+    )
+
+    args = parser.parse_args()
+    debug = args.debug or os.environ.get("PYTHON_DEBUG") == "1"
+
+    from db_service import get_themes_and_tags
+    from embed_text import MODEL_NAME, embed_vector, get_model
+
+    tagger = get_tagger(
+        get_themes_and_tags(), lambda: get_model(debug), MODEL_NAME, debug=debug
+    )
+    tagger.threshold = args.threshold
+    embedding = embed_vector([args.text], debug)
+    scores = tagger.scores(embedding)
+    print(
+        json.dumps(
+            {
+                "themes": tagger.assign(embedding),
+                "scores": {
+                    name: round(float(score), 4)
+                    for name, score in zip(tagger.names, scores)
+                },
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
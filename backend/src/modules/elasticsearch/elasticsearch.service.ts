@@ -46,6 +46,8 @@ export class ElasticsearchService implements OnModuleInit {
                 themes: { type: "keyword" },
                 publishedAt: { type: "date" },
                 createdAt: { type: "date" },
+                // Written by scripts/reembed.py
+                embeddingModel: { type: "keyword" },
                 // all-MiniLM-L6-v2 => 384 dimensions
                 embedding: {
                   type: "dense_vector",
@@ -309,25 +311,28 @@ export class ElasticsearchService implements OnModuleInit {
 
   async searchBlogPostsSemantic(query: string, size: number = 10) {
     try {
-      // First, get initial results with broad search
-      const initialResults = await this.searchBlogPosts(query, size * 3);
+      // First, get initial results with broad search. The Python reranker
+      // pre-scores every candidate lexically, so the pool can be widened
+      // (SEMANTIC_CANDIDATE_MULTIPLIER) without encoding all of them.
+      const multiplier =
+        Number(
+          this.configService.get<string>("SEMANTIC_CANDIDATE_MULTIPLIER")
+        ) || 3;
+      const initialResults = await this.searchBlogPosts(
+        query,
+        size * multiplier
+      );
 
       if (initialResults.length === 0) {
         return [];
       }
 
-      // Save results to temporary file for Python processing
-      const fs = require("fs");
-      const tempFile = `/tmp/search_results_${Date.now()}.json`;
-
       try {
-        fs.writeFileSync(tempFile, JSON.stringify(initialResults));
-
-        // Call Python semantic search script
-        const semanticResults = await this.runSemanticSearch(query, tempFile);
-
-        // Clean up temp file
-        fs.unlinkSync(tempFile);
+        // Candidates are piped to the Python semantic search script on stdin
+        const semanticResults = await this.runSemanticSearch(
+          query,
+          initialResults
+        );
 
         return semanticResults;
       } catch (error) {
@@ -343,7 +348,7 @@ export class ElasticsearchService implements OnModuleInit {
 
   private async runSemanticSearch(
     query: string,
-    resultsFile: string
+    results: any[]
   ): Promise<any[]> {
     return new Promise((resolve, reject) => {
       const enableDebug = process.env.PYTHON_DEBUG === "1";
@@ -355,7 +360,7 @@ export class ElasticsearchService implements OnModuleInit {
           "--query",
           query,
           "--results",
-          resultsFile,
+          "-",
           ...(enableDebug ? ["--debug"] : []),
         ],
         {
@@ -390,11 +395,27 @@ export class ElasticsearchService implements OnModuleInit {
         reject(procErr);
       });
 
+      // If the script exits before reading all candidates, writing to its
+      // stdin fails with EPIPE; without a listener that error would crash
+      // the server instead of rejecting this search
+      let stdinError: Error | null = null;
+      pythonProcess.stdin.on("error", (stdinErr) => {
+        stdinError = stdinErr;
+        this.logger.error(
+          `Failed to send candidates to semantic search: ${stdinErr.message}`
+        );
+        reject(stdinErr);
+      });
+
       pythonProcess.on("close", async (code) => {
         if (code !== 0) {
           reject(new Error(`Semantic search failed (exit ${code}): ${error}`));
           return;
         }
+        if (stdinError) {
+          // stdout only reflects part of the candidates, don't parse it
+          return;
+        }
 
         try {
           const result = JSON.parse(data);
@@ -410,6 +431,8 @@ export class ElasticsearchService implements OnModuleInit {
           );
         }
       });
+
+      pythonProcess.stdin.end(JSON.stringify(results));
     });
   }
 }
@@ -194,10 +194,20 @@ export class RssService {
   }
 
   async fetchAllRssFeeds() {
-    const feeds = await this.prisma.rssFeed.findMany({
+    const activeFeeds = await this.prisma.rssFeed.findMany({
       where: { isActive: true },
     });
 
+    // With an adaptive schedule, only poll the feeds that are due
+    let feeds = activeFeeds;
+    if (process.env.FEED_SCHEDULE_PATH) {
+      const due = new Set(
+        await this.getDueFeedUrls(activeFeeds.map((feed) => feed.url))
+      );
+      feeds = activeFeeds.filter((feed) => due.has(feed.url));
+      this.logger.log(`${feeds.length} of ${activeFeeds.length} feeds due`);
+    }
+
     const results = [];
     for (const feed of feeds) {
       try {
@@ -211,6 +221,41 @@ export class RssService {
     return results;
   }
 
+  private async getDueFeedUrls(urls: string[]): Promise<string[]> {
+    return new Promise((resolve, reject) => {
+      const pythonProcess = spawn(
+        "python3",
+        ["scripts/feed_scheduler.py", "--due"],
+        { env: process.env }
+      );
+
+      let data = "";
+      let error = "";
+      pythonProcess.stdout.on("data", (chunk) => (data += chunk.toString()));
+      pythonProcess.stderr.on("data", (chunk) => (error += chunk.toString()));
+      pythonProcess.on("error", reject);
+      // EPIPE when the scheduler exits before reading the URLs
+      pythonProcess.stdin.on("error", reject);
+      pythonProcess.on("close", (code) => {
+        if (code !== 0) {
+          reject(new Error(`Feed scheduler failed (exit ${code}): ${error}`));
+          return;
+        }
+        try {
+          resolve(JSON.parse(data));
+        } catch (parseError: any) {
+          reject(
+            new Error(
+              `Failed to parse feed scheduler output: ${parseError.message}`
+            )
+          );
+        }
+      });
+
+      pythonProcess.stdin.end(JSON.stringify(urls));
+    });
+  }
+
   private async fetchRssData(feed: RssFeed): Promise<any> {
     const { url, name: source } = feed;
     return new Promise((resolve, reject) => {